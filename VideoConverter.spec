@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('video_converter.py', '.')],
-    hiddenimports=['tkinterdnd2', 'PIL', 'cv2'],
+    hiddenimports=['tkinterdnd2'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
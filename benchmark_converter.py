@@ -0,0 +1,364 @@
+import os
+import sys
+import json
+import time
+import platform
+import shutil
+import argparse
+import statistics
+import subprocess
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: sem CPU/RSS dos processos filhos
+
+from video_converter import ProbeCache, ThreadBudget, VideoConverter
+
+# (codec de vídeo, codec de áudio) de cada família de fixture
+FIXTURE_CODECS = {
+    'h264': ('libx264', 'aac'),        # Remux no modo TS otimizado
+    'mpeg2': ('mpeg2video', 'mp2'),    # Típico de TV aberta: exige transcodificação
+}
+FIXTURE_RESOLUTIONS = ['640x360', '1280x720', '1920x1080']
+FIXTURE_DURATIONS = [10, 60]
+QUICK_FIXTURES = [('h264', '640x360', 10), ('mpeg2', '640x360', 10)]
+
+PATHS = ['convert_video', 'segmented', 'ts_optimized', 'audio']
+QUALITY_PATHS = {'convert_video', 'segmented'}
+
+
+def fixture_name(codec: str, resolution: str, duration: int) -> str:
+    return f"{codec}_{resolution}_{duration}s.ts"
+
+
+def generate_fixture(path: str, codec: str, resolution: str, duration: int, rate: int = 30):
+    """Gera um .ts determinístico com testsrc2 + seno (reaproveitado se já existir)"""
+    if os.path.exists(path):
+        return
+    video_codec, audio_codec = FIXTURE_CODECS[codec]
+    temp_path = path + '.tmp'
+    args = [
+        'ffmpeg', '-y', '-v', 'error', '-nostdin',
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate={rate}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-c:v', video_codec, '-g', str(rate * 2), '-pix_fmt', 'yuv420p',
+        '-c:a', audio_codec, '-b:a', '128k',
+        '-fflags', '+bitexact', '-flags', '+bitexact', '-map_metadata', '-1',
+        '-f', 'mpegts', temp_path
+    ]
+    if video_codec == 'libx264':
+        args[args.index('-g'):args.index('-g')] = ['-preset', 'veryfast']
+    subprocess.run(args, check=True)
+    os.replace(temp_path, path)
+
+
+def build_fixtures(fixtures_dir: str, quick: bool = False) -> List[dict]:
+    Path(fixtures_dir).mkdir(parents=True, exist_ok=True)
+    if quick:
+        specs = QUICK_FIXTURES
+    else:
+        specs = [(codec, resolution, duration) for codec in FIXTURE_CODECS
+                 for resolution in FIXTURE_RESOLUTIONS for duration in FIXTURE_DURATIONS]
+    
+    fixtures = []
+    for codec, resolution, duration in specs:
+        path = os.path.join(fixtures_dir, fixture_name(codec, resolution, duration))
+        print(f"Fixture: {os.path.basename(path)}")
+        generate_fixture(path, codec, resolution, duration)
+        fixtures.append({'name': os.path.basename(path), 'path': path, 'codec': codec,
+                         'resolution': resolution, 'duration': duration})
+    return fixtures
+
+
+def _rusage():
+    if resource is None:
+        return None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'cpu': children.ru_utime + children.ru_stime + own.ru_utime + own.ru_stime,
+        'peak_rss': max(children.ru_maxrss, own.ru_maxrss) * scale
+    }
+
+
+def _run_case(case: dict, output_dir: str, results):
+    """Executa um caso num processo novo, para que CPU e RSS dos filhos sejam só dele"""
+    converter = VideoConverter(probe_cache=ProbeCache(None))
+    source = case['fixture']['path']
+    stem = f"{Path(source).stem}_{case['path']}_{case['quality'] or 'na'}"
+    output = os.path.join(output_dir, stem + ('.m4a' if case['path'] == 'audio' else '.mp4'))
+    
+    before = _rusage()
+    start = time.perf_counter()
+    if case['path'] == 'convert_video':
+        success = converter.convert_video(source, output, quality=case['quality'])
+    elif case['path'] == 'segmented':
+        success = converter.convert_video_segmented(source, output, quality=case['quality'],
+                                                    min_segment_seconds=5.0)
+    elif case['path'] == 'ts_optimized':
+        success = converter.ts_to_mp4_optimized(source, output)
+    else:
+        success = converter.convert_to_audio(source, output)
+    wall = time.perf_counter() - start
+    after = _rusage()
+    
+    output_size = os.path.getsize(output) if success and os.path.exists(output) else None
+    if output_size is not None:
+        os.remove(output)
+    results.put({
+        'success': bool(success),
+        'wall': wall,
+        'cpu': after['cpu'] - before['cpu'] if after else None,
+        'peak_rss': after['peak_rss'] if after else None,
+        'output_size': output_size
+    })
+
+
+def measure(case: dict, output_dir: str, repeat: int) -> dict:
+    """Roda o caso `repeat` vezes e guarda a mediana de cada métrica"""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=_run_case, args=(case, output_dir, results))
+        process.start()
+        runs.append(results.get())
+        process.join()
+    
+    def median(name):
+        values = [run[name] for run in runs if run[name] is not None]
+        return statistics.median(values) if values else None
+    
+    wall = median('wall')
+    duration = case['fixture']['duration']
+    return {
+        'fixture': case['fixture']['name'],
+        'path': case['path'],
+        'quality': case['quality'],
+        'success': all(run['success'] for run in runs),
+        'wall_seconds': wall,
+        'realtime_factor': duration / wall if wall else None,
+        'cpu_seconds': median('cpu'),
+        'peak_rss_bytes': median('peak_rss'),
+        'output_bytes': median('output_size'),
+        'runs': len(runs)
+    }
+
+
+def ffmpeg_version() -> Optional[str]:
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
+        return result.stdout.splitlines()[0] if result.stdout else None
+    except OSError:
+        return None
+
+
+def run_benchmark(fixtures_dir: str, output_json: str, quick: bool = False,
+                  paths: Optional[List[str]] = None, qualities: Optional[List[str]] = None,
+                  repeat: int = 1) -> dict:
+    paths = paths or PATHS
+    qualities = qualities or list(VideoConverter.QUALITY_SETTINGS)
+    fixtures = build_fixtures(fixtures_dir, quick)
+    work_dir = os.path.join(fixtures_dir, 'out')
+    Path(work_dir).mkdir(exist_ok=True)
+    
+    cases = []
+    for fixture in fixtures:
+        for path in paths:
+            for quality in (qualities if path in QUALITY_PATHS else [None]):
+                cases.append({'fixture': fixture, 'path': path, 'quality': quality})
+    
+    results = []
+    for index, case in enumerate(cases, 1):
+        result = measure(case, work_dir, repeat)
+        results.append(result)
+        status = '✓' if result['success'] else '✗'
+        print(f"[{index}/{len(cases)}] {status} {result['fixture']} {result['path']} "
+              f"{result['quality'] or '-'}: {result['wall_seconds']:.2f}s "
+              f"({result['realtime_factor'] or 0:.1f}x tempo real)")
+    
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpu_count': os.cpu_count(), 'ffmpeg': ffmpeg_version()},
+        'results': results
+    }
+    with open(output_json, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados salvos em {output_json}")
+    return report
+
+
+def _run_batch(setup: dict, input_dir: str, output_dir: str, results):
+    """Converte o lote inteiro num processo novo com um arranjo de threads"""
+    converter = VideoConverter(probe_cache=ProbeCache(None))
+    before = _rusage()
+    start = time.perf_counter()
+    outputs = converter.batch_convert(input_dir, output_dir, quality=setup['quality'],
+                                      workers=setup['workers'], thread_mode=setup['thread_mode'])
+    wall = time.perf_counter() - start
+    after = _rusage()
+    results.put({'wall': wall, 'cpu': after['cpu'] - before['cpu'] if after else None,
+                 'converted': len(outputs)})
+
+
+def _prepare_batch(fixtures_dir: str, jobs: int, resolution: str, duration: int) -> str:
+    """Pasta com `jobs` cópias da mesma fixture MPEG-2 (lote de arquivos iguais)"""
+    source = os.path.join(fixtures_dir, fixture_name('mpeg2', resolution, duration))
+    Path(fixtures_dir).mkdir(parents=True, exist_ok=True)
+    generate_fixture(source, 'mpeg2', resolution, duration)
+    
+    input_dir = os.path.join(fixtures_dir, 'batch_in')
+    shutil.rmtree(input_dir, ignore_errors=True)
+    Path(input_dir).mkdir()
+    for index in range(jobs):
+        shutil.copyfile(source, os.path.join(input_dir, f"job{index:02d}.ts"))
+    return input_dir
+
+
+def _time_batch(setup: dict, input_dir: str, output_dir: str) -> dict:
+    """Roda o lote num processo novo (sem cache nem threads herdados) e devolve os tempos"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_batch, args=(setup, input_dir, output_dir, queue))
+    process.start()
+    run = queue.get()
+    process.join()
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return run
+
+
+def thread_benchmark(fixtures_dir: str, jobs: Optional[int] = None, quality: str = 'medium',
+                     resolution: str = '1280x720', duration: int = 10) -> List[dict]:
+    """Compara arranjos de processos x threads num lote de arquivos iguais
+    
+    'ingênuo' roda um processo ffmpeg por núcleo, cada um com os threads
+    padrão do ffmpeg (também um por núcleo); os demais usam o ThreadBudget.
+    """
+    cores = os.cpu_count() or 1
+    jobs = jobs or max(4, cores)
+    input_dir = _prepare_batch(fixtures_dir, jobs, resolution, duration)
+    
+    setups = [{'name': 'ingênuo', 'workers': cores, 'thread_mode': None}]
+    setups += [{'name': mode, 'workers': 1, 'thread_mode': mode} for mode in ('latency', 'throughput', 'auto')]
+    print(f"{jobs} arquivos {resolution} {duration}s, {cores} núcleo(s)")
+    
+    results = []
+    for setup in setups:
+        run = _time_batch(dict(setup, quality=quality), input_dir, os.path.join(fixtures_dir, 'batch_out'))
+        plan = ThreadBudget(cores, setup['thread_mode']).describe(jobs) if setup['thread_mode'] else \
+            f"{cores} processo(s) x threads padrão"
+        result = {'setup': setup['name'], 'plan': plan, 'wall_seconds': run['wall'],
+                  'cpu_seconds': run['cpu'], 'files_per_minute': run['converted'] * 60 / run['wall']}
+        results.append(result)
+        print(f"{setup['name']:<11} {run['wall']:>7.2f}s {result['files_per_minute']:>6.1f} arq/min  ({plan})")
+    
+    shutil.rmtree(input_dir, ignore_errors=True)
+    naive = results[0]['wall_seconds']
+    for result in results[1:]:
+        print(f"{result['setup']}: {naive / result['wall_seconds']:.2f}x em relação ao ingênuo")
+    return results
+
+
+def batch_benchmark(fixtures_dir: str, workers: int, jobs: Optional[int] = None, quality: str = 'medium',
+                    resolution: str = '1280x720', duration: int = 10) -> dict:
+    """Speedup real do lote: o mesmo lote com workers=1 (serial) e com workers=N"""
+    jobs = jobs or max(4, workers)
+    input_dir = _prepare_batch(fixtures_dir, jobs, resolution, duration)
+    print(f"{jobs} arquivos {resolution} {duration}s, {os.cpu_count() or 1} núcleo(s)")
+    
+    runs = {}
+    for count in (1, workers):
+        run = _time_batch({'workers': count, 'thread_mode': None, 'quality': quality},
+                          input_dir, os.path.join(fixtures_dir, 'batch_out'))
+        runs[count] = run
+        cpu = f", CPU {run['cpu']:.1f}s" if run['cpu'] is not None else ''
+        print(f"workers={count:<3} {run['wall']:>7.2f}s{cpu} ({run['converted']} convertidos)")
+    
+    shutil.rmtree(input_dir, ignore_errors=True)
+    speedup = runs[1]['wall'] / runs[workers]['wall']
+    print(f"Speedup de workers={workers} sobre o serial: {speedup:.2f}x")
+    return {'jobs': jobs, 'workers': workers, 'serial_seconds': runs[1]['wall'],
+            'parallel_seconds': runs[workers]['wall'], 'speedup': speedup}
+
+
+def compare(baseline_json: str, current_json: str, threshold: float = 0.10) -> int:
+    """Compara duas execuções; retorna o número de regressões acima do limite"""
+    with open(baseline_json, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_json, encoding='utf-8') as f:
+        current = json.load(f)
+    
+    def key(result):
+        return result['fixture'], result['path'], result['quality']
+    
+    old_results: Dict[tuple, dict] = {key(result): result for result in baseline['results']}
+    regressions = 0
+    print(f"{'caso':<52} {'tempo antes':>11} {'depois':>9} {'Δ tempo':>8} {'Δ tamanho':>10}")
+    for result in current['results']:
+        old = old_results.get(key(result))
+        name = f"{result['fixture']} {result['path']} {result['quality'] or '-'}"
+        if not old or not old['wall_seconds'] or not result['wall_seconds']:
+            print(f"{name:<52} {'(sem base)':>11}")
+            continue
+        
+        time_delta = result['wall_seconds'] / old['wall_seconds'] - 1
+        size_delta = None
+        if old['output_bytes'] and result['output_bytes']:
+            size_delta = result['output_bytes'] / old['output_bytes'] - 1
+        
+        flag = ''
+        if time_delta > threshold or (size_delta or 0) > threshold or (old['success'] and not result['success']):
+            regressions += 1
+            flag = '  ⚠ regressão'
+        size_text = f"{size_delta:+.1%}" if size_delta is not None else '-'
+        print(f"{name:<52} {old['wall_seconds']:>10.2f}s {result['wall_seconds']:>8.2f}s "
+              f"{time_delta:>+8.1%} {size_text:>10}{flag}")
+    
+    print(f"\n{regressions} regressão(ões) acima de {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos de conversão')
+    parser.add_argument('--fixtures-dir', default='bench_fixtures', help='Pasta das fixtures geradas')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='Arquivo JSON de resultados')
+    parser.add_argument('--quick', action='store_true', help='Só duas fixtures pequenas')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, help='Caminhos de conversão a medir')
+    parser.add_argument('--qualities', nargs='+', choices=list(VideoConverter.QUALITY_SETTINGS),
+                       help='Níveis de qualidade a medir')
+    parser.add_argument('--repeat', type=int, default=1, help='Repetições por caso (usa a mediana)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'ATUAL'), help='Comparar dois JSONs de resultados')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Piora relativa considerada regressão')
+    parser.add_argument('--threads', action='store_true',
+                       help='Comparar arranjos de processos x threads (ThreadBudget) num lote')
+    parser.add_argument('--thread-jobs', type=int,
+                       help='Arquivos no lote do --threads/--batch-workers (padrão: máx(4, núcleos/workers))')
+    parser.add_argument('--batch-workers', type=int, metavar='N',
+                       help='Medir o speedup do lote: mesmo lote com workers=1 e com workers=N')
+    
+    args = parser.parse_args()
+    
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+    if args.threads:
+        thread_benchmark(args.fixtures_dir, jobs=args.thread_jobs)
+        return
+    if args.batch_workers:
+        batch_benchmark(args.fixtures_dir, args.batch_workers, jobs=args.thread_jobs)
+        return
+    
+    run_benchmark(args.fixtures_dir, args.output, quick=args.quick, paths=args.paths,
+                  qualities=args.qualities, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import statistics
+import subprocess
+from typing import List, Optional
+
+# Módulo -> classe da janela principal
+GUIS = {
+    'video_converter_gui_final': 'VideoConverterGUI',
+    'video_converter_gui': 'VideoConverterGUI',
+    'video_converter_gui_lite_ultra_debug': 'VideoConverterGUILite',
+}
+MARKER = 'STARTUP_BENCHMARK '
+
+
+def _child(module_name: str, launched: float):
+    """Roda no processo filho: importa a GUI, cria a janela e espera ela aparecer"""
+    started = time.time()
+    module = importlib.import_module(module_name)
+    imported = time.time()
+    app = getattr(module, GUIS.get(module_name, 'VideoConverterGUI'))()
+    created = time.time()
+    app.root.update_idletasks()
+    app.root.wait_visibility()
+    app.root.update()
+    painted = time.time()
+    
+    print(MARKER + json.dumps({
+        'interpreter': started - launched,
+        'import': imported - started,
+        'construct': created - imported,
+        'paint': painted - created,
+        'visible': painted - launched
+    }), flush=True)
+    # Sem esperar threads de fundo (miniaturas, probe, verificação do FFmpeg)
+    os._exit(0)
+
+
+def measure(module_name: str, timeout: float = 60.0) -> dict:
+    """Abre a GUI num processo novo e devolve os tempos de cada fase"""
+    launched = time.time()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', module_name, str(launched)],
+                            capture_output=True, text=True, timeout=timeout)
+    for line in result.stdout.splitlines():
+        if line.startswith(MARKER):
+            return json.loads(line[len(MARKER):])
+    error = (result.stderr.strip().splitlines() or ['sem saída'])[-1]
+    raise RuntimeError(f"{module_name} não abriu: {error}")
+
+
+def import_breakdown(module_name: str, top: int = 15) -> List[tuple]:
+    """Módulos mais caros de importar (tempo cumulativo de -X importtime, em segundos)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules.append((int(cumulative) / 1e6, name.rstrip()))
+        except ValueError:
+            continue  # Cabeçalho da tabela
+    modules.sort(reverse=True)
+    return modules[:top]
+
+
+def run(modules: List[str], repeat: int, target: Optional[float], detail: bool) -> int:
+    """Mede cada GUI `repeat` vezes (mediana); retorna quantas passaram do alvo"""
+    over_target = 0
+    print(f"{'gui':<38} {'python':>7} {'import':>7} {'criar':>7} {'pintar':>7} {'visível':>8}")
+    for module_name in modules:
+        if detail:
+            print(f"{module_name}: importações mais caras")
+            for seconds, name in import_breakdown(module_name):
+                print(f"    {seconds * 1000:>8.1f}ms  {name}")
+        try:
+            runs = [measure(module_name) for _ in range(repeat)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"{module_name:<38} erro: {e}")
+            over_target += 1
+            continue
+        
+        median = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+        flag = ''
+        if target and median['visible'] > target:
+            over_target += 1
+            flag = f'  ⚠ acima de {target:.2f}s'
+        print(f"{module_name:<38} " + ' '.join(f"{median[phase] * 1000:>6.0f}ms" for phase in
+              ('interpreter', 'import', 'construct', 'paint')) + f" {median['visible'] * 1000:>6.0f}ms{flag}")
+    return over_target
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        _child(sys.argv[2], float(sys.argv[3]))
+        return
+    
+    parser = argparse.ArgumentParser(description='Tempo até a janela das GUIs aparecer')
+    parser.add_argument('guis', nargs='*', default=list(GUIS), help='Módulos de GUI a medir')
+    parser.add_argument('--repeat', type=int, default=3, help='Aberturas por GUI (usa a mediana)')
+    parser.add_argument('--target', type=float, help='Tempo máximo (s) até a janela aparecer; sai com erro se passar')
+    parser.add_argument('--imports', action='store_true', help='Mostrar os módulos mais caros de importar')
+    
+    args = parser.parse_args()
+    sys.exit(1 if run(args.guis, args.repeat, args.target, args.imports) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,9 +31,7 @@ def build_executable():
         '--name=VideoConverter',        # Nome do executável
         '--icon=icon.ico',             # Ícone (se existir)
         '--add-data=video_converter.py;.',  # Incluir módulo
-        '--hidden-import=tkinterdnd2',  # Importação oculta
-        '--hidden-import=PIL',          # Importação oculta
-        '--hidden-import=cv2',          # Importação oculta
+        '--hidden-import=tkinterdnd2',  # Importação oculta (carregado sob demanda)
         'video_converter_gui_final.py'  # Arquivo principal
     ]
     
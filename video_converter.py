@@ -1,153 +1,1885 @@
 import os
+import re
 import sys
+import atexit
+import json
+import hashlib
+import time
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+import threading
+import fnmatch
+import heapq
+import itertools
+import functools
 import ffmpeg
+from collections import OrderedDict, deque
 from pathlib import Path
 import argparse
-from typing import List, Optional
+from datetime import datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Iterable, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: sem tempo de CPU dos processos filhos
+
+from video_converter_metrics import ConverterMetrics
+
+ProgressCallback = Callable[[dict], None]
+
+
+class ConversionCancelled(Exception):
+    """Conversão interrompida por VideoConverter.cancel()"""
+    
+    def __init__(self, message: str = "Conversão cancelada pelo usuário"):
+        super().__init__(message)
+
+
+def _parse_progress(fields: dict, duration: Optional[float]) -> dict:
+    """Converte um bloco de -progress do ffmpeg em um evento de progresso"""
+    def to_float(value):
+        try:
+            return float(str(value).rstrip('x').replace('kbits/s', ''))
+        except (TypeError, ValueError):
+            return None
+    
+    out_time_us = to_float(fields.get('out_time_us') or fields.get('out_time_ms'))
+    out_time = max(out_time_us / 1_000_000, 0.0) if out_time_us is not None else 0.0
+    speed = to_float(fields.get('speed'))
+    done = fields.get('progress') == 'end'
+    
+    percent = None
+    eta = None
+    if duration:
+        percent = 100.0 if done else min(out_time / duration * 100, 100.0)
+        if speed:
+            eta = max(duration - out_time, 0.0) / speed
+    
+    return {
+        'out_time': out_time,
+        'fps': to_float(fields.get('fps')),
+        'speed': speed,
+        'bitrate': to_float(fields.get('bitrate')),  # kbit/s
+        'eta': 0.0 if done else eta,
+        'percent': percent,
+        'duration': duration,
+        'done': done
+    }
+
+
+def _list_directory(directory: str, extensions: set, exclude: tuple):
+    """Lê um diretório e separa arquivos de mídia e subdiretórios"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        path = os.path.normcase(entry.path)
+                        # A própria pasta excluída e tudo abaixo dela
+                        if not any(path == excluded or path.startswith(excluded + os.sep) for excluded in exclude):
+                            subdirs.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                        files.append(entry)
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Erro ao ler diretório {directory}: {e}")
+    return files, subdirs
+
+
+def scan_media_files(root: str, extensions: Iterable[str], recursive: bool = True,
+                     workers: int = 1, exclude: Iterable[str] = ()) -> Iterator[os.DirEntry]:
+    """Gera os arquivos de mídia sob root à medida que são encontrados
+    
+    Usa os.scandir e devolve os próprios os.DirEntry, cujo stat() fica em
+    cache (no Windows já vem da listagem), evitando stats repetidos. Com
+    workers > 1 os subdiretórios são lidos em paralelo, o que compensa a
+    latência de compartilhamentos de rede.
+    """
+    extensions = {extension.lower() for extension in extensions}
+    exclude = tuple(os.path.normcase(os.path.abspath(path)) for path in exclude)
+    
+    if workers <= 1:
+        stack = [os.path.abspath(root)]
+        while stack:
+            files, subdirs = _list_directory(stack.pop(), extensions, exclude)
+            yield from files
+            if recursive:
+                stack.extend(reversed(subdirs))
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_list_directory, os.path.abspath(root), extensions, exclude)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                if recursive:
+                    pending.update(executor.submit(_list_directory, subdir, extensions, exclude)
+                                   for subdir in subdirs)
+                yield from files
+
+
+class ProbeCache:
+    """Cache de resultados do ffprobe em memória (LRU) e em disco (SQLite)
+    
+    As entradas são indexadas pelo caminho absoluto e só valem enquanto
+    tamanho e mtime do arquivo não mudarem. As gravações em disco são
+    agrupadas (um commit a cada COMMIT_EVERY entradas ou COMMIT_SECONDS,
+    e em flush()). Quando o banco passa de max_entries * PRUNE_SLACK
+    linhas, as mais antigas são apagadas até sobrarem max_entries; a folga
+    evita podar a cada commit.
+    """
+    
+    COMMIT_EVERY = 64
+    COMMIT_SECONDS = 5.0
+    PRUNE_SLACK = 1.25
+    
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._last_commit = time.monotonic()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if db_path:
+            try:
+                Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS probe '
+                    '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, info TEXT)'
+                )
+                self._db.commit()
+                self._rows = self._db.execute('SELECT COUNT(*) FROM probe').fetchone()[0]
+                # Entradas ainda pendentes são gravadas na saída do programa
+                atexit.register(self.flush)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Cache de probe em disco indisponível: {e}")
+                self._db = None
+    
+    @staticmethod
+    def file_key(path: str, stat: Optional[os.stat_result] = None) -> tuple:
+        """Identidade do arquivo: (caminho absoluto, tamanho, mtime em ns)"""
+        stat = stat or os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+    
+    def get(self, key: tuple) -> Optional[dict]:
+        """Retorna as informações em cache ou None"""
+        path, size, mtime_ns = key
+        with self._lock:
+            info = self._memory.get(key)
+            if info is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(info)
+            
+            pending = self._pending.get(path)
+            if pending is not None and pending[:2] == (size, mtime_ns):
+                self._remember(key, pending[2])
+                self.memory_hits += 1
+                return dict(pending[2])
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        'SELECT info FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?',
+                        (path, size, mtime_ns)
+                    ).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row:
+                    info = json.loads(row[0])
+                    self._remember(key, info)
+                    self.disk_hits += 1
+                    return dict(info)
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: tuple, info: dict):
+        """Guarda as informações em memória; o disco recebe em lotes"""
+        with self._lock:
+            self._remember(key, dict(info))
+            if self._db is None:
+                return
+            path, size, mtime_ns = key
+            self._pending[path] = (size, mtime_ns, dict(info))
+            if (len(self._pending) >= self.COMMIT_EVERY
+                    or time.monotonic() - self._last_commit >= self.COMMIT_SECONDS):
+                self._flush_locked()
+    
+    def flush(self):
+        """Grava no disco as entradas pendentes (numa única transação)"""
+        with self._lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        self._last_commit = time.monotonic()
+        if self._db is None or not self._pending:
+            return
+        rows = [(path, size, mtime_ns, json.dumps(info)) for path, (size, mtime_ns, info) in self._pending.items()]
+        self._pending.clear()
+        try:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?)', rows)
+                # INSERT OR REPLACE pode só substituir linhas: contar de novo em vez de somar
+                self._rows = self._db.execute('SELECT COUNT(*) FROM probe').fetchone()[0]
+                if self._rows > self.max_entries * self.PRUNE_SLACK:
+                    # INSERT OR REPLACE gera rowid novo: os menores são as entradas mais antigas
+                    self._db.execute('DELETE FROM probe WHERE rowid NOT IN '
+                                     '(SELECT rowid FROM probe ORDER BY rowid DESC LIMIT ?)', (self.max_entries,))
+                    self._rows = min(self._rows, self.max_entries)
+        except sqlite3.Error:
+            pass
+    
+    def _remember(self, key: tuple, info: dict):
+        self._memory[key] = info
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def stats(self) -> dict:
+        """Contadores de acertos e falhas do cache"""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self._memory)
+        }
+
+
+class FFmpegCapabilityError(Exception):
+    """O ffmpeg instalado não tem um encoder, muxer ou filtro pedido pelo job"""
+
+
+class FFmpegCapabilities:
+    """Encoders, muxers, filtros e hwaccels do ffmpeg instalado
+    
+    A descoberta roda o ffmpeg uma vez; o resultado fica num JSON em disco
+    indexado por caminho, tamanho e mtime do executável, então atualizar ou
+    trocar o ffmpeg refaz a descoberta. Nas demais aberturas basta um stat
+    e a leitura do JSON.
+    """
+    
+    # Extensão -> muxer que o ffmpeg escolhe para ela
+    EXTENSION_MUXERS = {
+        '.mp4': 'mp4', '.m4v': 'mp4', '.m4a': 'ipod', '.mov': 'mov', '.mkv': 'matroska',
+        '.webm': 'webm', '.avi': 'avi', '.flv': 'flv', '.wmv': 'asf', '.ts': 'mpegts',
+        '.m2ts': 'mpegts', '.mp3': 'mp3', '.aac': 'adts', '.flac': 'flac', '.ogg': 'ogg',
+        '.opus': 'opus', '.wav': 'wav'
+    }
+    
+    def __init__(self, cache_path: Optional[str] = None, binary: str = 'ffmpeg'):
+        self.cache_path = cache_path
+        self.binary = binary
+        self._path = None
+        self._key = None
+        self._data = None
+        self._lock = threading.Lock()
+    
+    def binary_key(self) -> Optional[tuple]:
+        """Identidade do executável: (caminho real, tamanho, mtime em ns); None se não encontrado"""
+        # O PATH só é percorrido de novo se o executável encontrado antes sumir
+        for _ in range(2):
+            if self._path is None:
+                found = shutil.which(self.binary)
+                if not found:
+                    return None
+                self._path = os.path.realpath(found)
+            try:
+                stat = os.stat(self._path)
+                return self._path, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                self._path = None
+        return None
+    
+    def load(self) -> Optional[dict]:
+        """Capacidades do ffmpeg atual (descobre e grava o cache se preciso)"""
+        with self._lock:
+            key = self.binary_key()
+            if key is None:
+                return None
+            if key != self._key:
+                data = self._read_cache(key)
+                if data is None:
+                    data = self._discover()
+                    self._write_cache(key, data)
+                data['muxers'] = set(data['muxers'])
+                data['filters'] = set(data['filters'])
+                self._key, self._data = key, data
+            return self._data
+    
+    def _read_cache(self, key: tuple) -> Optional[dict]:
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached['capabilities'] if tuple(cached.get('key', ())) == key else None
+    
+    def _write_cache(self, key: tuple, data: dict):
+        if not self.cache_path:
+            return
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'capabilities': data}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Cache de capacidades do FFmpeg indisponível: {e}")
+    
+    def _list(self, option: str) -> List[str]:
+        result = subprocess.run([self.binary, '-hide_banner', option], capture_output=True, text=True,
+                                encoding='utf-8', errors='replace')
+        return result.stdout.splitlines()
+    
+    def _discover(self) -> dict:
+        """Lê -encoders, -muxers, -filters e -hwaccels do ffmpeg"""
+        encoders = {}
+        for line in self._list('-encoders'):
+            match = re.match(r'\s*([VAS])[.A-Z]{5}\s+(\S+)\s.*?(?:\(codec (\S+)\))?$', line)
+            if match:
+                kind, name, codec = match.groups()
+                encoders[name] = kind
+                if codec:
+                    # '-c:a mp3' funciona com o encoder padrão do codec (libmp3lame)
+                    encoders.setdefault(codec, kind)
+        
+        muxers = []
+        for line in self._list('-muxers'):
+            match = re.match(r'\s*D?E\s+(\S+)\s', line)
+            if match:
+                muxers.extend(match.group(1).split(','))
+        
+        filters = []
+        for line in self._list('-filters'):
+            match = re.match(r'\s*[TSC.]{2,3}\s+(\S+)\s+\S*->\S*', line)
+            if match:
+                filters.append(match.group(1))
+        
+        hwaccels = [line.strip() for line in self._list('-hwaccels')[1:] if line.strip()]
+        version = self._list('-version')
+        return {
+            'version': version[0] if version else '',
+            'encoders': encoders,
+            'muxers': muxers,
+            'filters': filters,
+            'hwaccels': hwaccels
+        }
+    
+    def problems(self, output_path: Optional[str] = None, encoders: Iterable[str] = (),
+                 filters: Iterable[str] = (), output_format: Optional[str] = None) -> List[str]:
+        """Itens pedidos que o ffmpeg instalado não suporta (lista vazia = tudo certo)"""
+        data = self.load()
+        if data is None:
+            return ["FFmpeg não encontrado"]
+        
+        # Listas vazias (saída do ffmpeg num formato inesperado) não bloqueiam nada
+        problems = []
+        if data['encoders']:
+            problems += [f"encoder '{encoder}' indisponível" for encoder in encoders
+                         if encoder and encoder != 'copy' and encoder not in data['encoders']]
+        muxer = output_format
+        if not muxer and output_path:
+            muxer = self.EXTENSION_MUXERS.get(Path(output_path).suffix.lower())
+        if muxer and data['muxers'] and muxer not in data['muxers']:
+            problems.append(f"formato de saída '{muxer}' indisponível")
+        if data['filters']:
+            problems += [f"filtro '{name}' indisponível" for name in filters if name not in data['filters']]
+        return problems
+
+
+class ConversionJournal:
+    """Diário de conversões (JSON Lines) mantido na pasta de saída
+    
+    Cada conversão grava uma linha 'started' antes de começar e uma linha
+    'done' ao terminar; a última linha de cada entrada prevalece. Uma
+    entrada sem 'done' indica saída incompleta, que deve ser refeita.
+    """
+    
+    FILENAME = '.conversion_journal.jsonl'
+    HASH_BYTES = 1024 * 1024
+    
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Linha truncada por uma queda no meio da escrita
+                self._entries[record['input']] = record
+        
+        # Compactar quando o histórico cresceu demais
+        if lines > 2 * len(self._entries) + 100:
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in self._entries.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
+    
+    @classmethod
+    def partial_hash(cls, path: str, size: int) -> str:
+        """Hash do início e do fim do arquivo (barato mesmo em arquivos enormes)"""
+        digest = hashlib.sha1(str(size).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read(cls.HASH_BYTES))
+            if size > 2 * cls.HASH_BYTES:
+                f.seek(-cls.HASH_BYTES, os.SEEK_END)
+                digest.update(f.read(cls.HASH_BYTES))
+        return digest.hexdigest()
+    
+    def is_up_to_date(self, input_path: str, output_path: str, settings: dict,
+                      stat: Optional[os.stat_result] = None) -> bool:
+        """Verifica se a saída existente veio desta mesma entrada e configuração"""
+        record = self._entries.get(os.path.abspath(input_path))
+        if not record or record['status'] != 'done':
+            return False
+        if record['output'] != os.path.abspath(output_path) or record['settings'] != settings:
+            return False
+        
+        try:
+            if os.path.getsize(output_path) != record['output_size']:
+                return False
+            stat = stat or os.stat(input_path)
+        except OSError:
+            return False
+        
+        if stat.st_size != record['input_size']:
+            return False
+        if stat.st_mtime_ns == record['input_mtime_ns']:
+            return True
+        
+        # Mesmo tamanho mas mtime diferente (cópia, touch): confirmar pelo conteúdo
+        if self.partial_hash(input_path, stat.st_size) != record['input_hash']:
+            return False
+        self._append(dict(record, input_mtime_ns=stat.st_mtime_ns))
+        return True
+    
+    def mark_started(self, input_path: str, output_path: str, settings: dict):
+        self._append({
+            'input': os.path.abspath(input_path),
+            'output': os.path.abspath(output_path),
+            'settings': settings,
+            'status': 'started',
+            'time': time.time()
+        })
+    
+    def mark_finished(self, input_path: str, output_path: str, settings: dict, success: bool):
+        record = {
+            'input': os.path.abspath(input_path),
+            'output': os.path.abspath(output_path),
+            'settings': settings,
+            'status': 'done' if success else 'failed',
+            'time': time.time()
+        }
+        if success:
+            stat = os.stat(input_path)
+            record.update({
+                'input_size': stat.st_size,
+                'input_mtime_ns': stat.st_mtime_ns,
+                'input_hash': self.partial_hash(input_path, stat.st_size),
+                'output_size': os.path.getsize(output_path)
+            })
+        self._append(record)
+    
+    def _append(self, record: dict):
+        with self._lock:
+            self._entries[record['input']] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class SpeedBudget:
+    """Meta de velocidade de codificação: fator de tempo real mínimo e/ou horário limite
+    
+    Com horário limite, a velocidade exigida é recalculada a cada job a
+    partir dos segundos de mídia ainda pendentes e do tempo que resta,
+    dividido entre os workers.
+    """
+    
+    def __init__(self, realtime: Optional[float] = None, deadline: Optional[str] = None,
+                 workers: int = 1):
+        self.realtime = realtime
+        self.deadline = self.parse_deadline(deadline) if deadline else None
+        self.workers = max(1, workers)
+        self._remaining = 0.0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def parse_deadline(deadline: str, now: Optional[datetime] = None) -> datetime:
+        """Aceita 'HH:MM' (próxima ocorrência) ou data/hora ISO ('2024-05-01T06:00')"""
+        now = now or datetime.now()
+        try:
+            clock = datetime.strptime(deadline, '%H:%M')
+        except ValueError:
+            return datetime.fromisoformat(deadline)
+        target = now.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+        return target if target > now else target + timedelta(days=1)
+    
+    def add(self, media_seconds: float):
+        """Registra mídia pendente (chamado ao enfileirar um job)"""
+        with self._lock:
+            self._remaining += media_seconds
+    
+    def done(self, media_seconds: float):
+        with self._lock:
+            self._remaining = max(0.0, self._remaining - media_seconds)
+    
+    def target_speed(self) -> Optional[float]:
+        """Fator de tempo real exigido agora (None se não há meta)"""
+        target = self.realtime or 0.0
+        if self.deadline:
+            seconds_left = (self.deadline - datetime.now()).total_seconds()
+            if seconds_left <= 0:
+                return float('inf')
+            with self._lock:
+                target = max(target, self._remaining / (seconds_left * self.workers))
+        return target or None
+
+
+class JobScheduler:
+    """Fila de jobs do lote ordenada por prioridade e, dentro dela, pela política
+    
+    Políticas: 'fifo' (ordem de chegada), 'longest' (mais caros primeiro,
+    menor tempo total com vários workers) e 'shortest' (mais baratos
+    primeiro, resultados mais cedo). O custo estimado é a duração pesada
+    pelo codec de origem e pela resolução. Prioridades maiores passam à
+    frente e podem ser mudadas com o lote em andamento.
+    """
+    
+    POLICIES = ('fifo', 'longest', 'shortest')
+    # Custo relativo de decodificação por codec de origem (H.264 = 1)
+    CODEC_COST = {'mpeg2video': 0.6, 'mpeg4': 0.8, 'h264': 1.0, 'vp9': 1.4, 'hevc': 1.6, 'av1': 1.8}
+    
+    def __init__(self, policy: str = 'fifo'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política desconhecida: {policy}")
+        self.policy = policy
+        self._heap = []
+        self._entries = {}   # chave -> [-prioridade, ordem, seq, chave, job, custo, válido]
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        # Com política por custo, os workers esperam a varredura terminar para ver todos os jobs
+        self._released = policy == 'fifo'
+    
+    @classmethod
+    def estimate_cost(cls, info: dict) -> float:
+        """Custo estimado em 'segundos de H.264 1080p'"""
+        duration = info.get('duration') or 0.0
+        pixels = (info.get('width') or 1920) * (info.get('height') or 1080)
+        return duration * cls.CODEC_COST.get(info.get('video_codec'), 1.0) * pixels / (1920 * 1080)
+    
+    def _push(self, key, job, cost: float, priority: int):
+        order = {'fifo': 0, 'longest': -cost, 'shortest': cost}[self.policy]
+        entry = [-priority, order, next(self._counter), key, job, cost, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+    
+    def put(self, key, job, cost: float = 0.0, priority: int = 0):
+        with self._condition:
+            self._push(key, job, cost, priority)
+            self._condition.notify()
+    
+    def set_priority(self, key, priority: int) -> bool:
+        """Muda a prioridade de um job ainda pendente; False se ele já saiu da fila"""
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if -entry[0] != priority:
+                entry[6] = False   # A entrada antiga fica no heap e é ignorada
+                self._push(key, entry[4], entry[5], priority)
+            return True
+    
+    @property
+    def lock(self):
+        """Lock (reentrante) usado por put/get; segurá-lo torna uma sequência de mudanças atômica"""
+        return self._condition
+    
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._entries)
+    
+    def pending_keys(self) -> List:
+        with self._condition:
+            return list(self._entries)
+    
+    def release(self):
+        """Libera os workers (fim da varredura)"""
+        with self._condition:
+            self._released = True
+            self._condition.notify_all()
+    
+    def close(self):
+        """Não haverá mais jobs; get() retorna None quando a fila esvaziar"""
+        with self._condition:
+            self._closed = True
+            self._released = True
+            self._condition.notify_all()
+    
+    def cancel_pending(self):
+        with self._condition:
+            self._heap.clear()
+            self._entries.clear()
+            self._condition.notify_all()
+    
+    def get(self):
+        """Próximo job (bloqueia); None quando a fila foi fechada e esvaziou"""
+        with self._condition:
+            while True:
+                while self._heap and not self._heap[0][6]:
+                    heapq.heappop(self._heap)
+                if self._heap and self._released:
+                    entry = heapq.heappop(self._heap)
+                    del self._entries[entry[3]]
+                    return entry[4]
+                if self._closed and not self._heap:
+                    return None
+                self._condition.wait()
+
+
+class ThreadBudget:
+    """Divide os núcleos da máquina entre os processos ffmpeg simultâneos
+    
+    'latency': um job por vez usando todos os núcleos (o primeiro resultado
+    sai antes). 'throughput': vários jobs com poucos threads cada, já que o
+    x264 perde eficiência por thread acima de uns poucos threads e vários
+    processos com o padrão do ffmpeg (um thread por núcleo cada) disputam
+    CPU e cache. 'auto': como throughput, mas quando sobram menos jobs que
+    vagas os últimos recebem os núcleos livres.
+    """
+    
+    MODES = ('auto', 'latency', 'throughput')
+    
+    def __init__(self, cores: Optional[int] = None, mode: str = 'auto', threads_per_job: int = 2):
+        if mode not in self.MODES:
+            raise ValueError(f"Modo desconhecido: {mode}")
+        self.cores = cores or os.cpu_count() or 1
+        self.mode = mode
+        self.threads_per_job = max(1, min(threads_per_job, self.cores))
+    
+    def concurrency(self, queued_jobs: Optional[int] = None) -> int:
+        """Quantos processos ffmpeg rodar ao mesmo tempo"""
+        if self.mode == 'latency':
+            return 1
+        slots = max(1, self.cores // self.threads_per_job)
+        return max(1, min(slots, queued_jobs)) if queued_jobs else slots
+    
+    def threads_for(self, pending_jobs: int) -> int:
+        """Threads para o próximo job, dado o total de jobs rodando + na fila"""
+        if self.mode == 'latency':
+            return self.cores
+        if self.mode == 'throughput':
+            return self.threads_per_job
+        return max(1, self.cores // max(1, min(self.concurrency(), pending_jobs)))
+    
+    def describe(self, queued_jobs: Optional[int] = None) -> str:
+        concurrency = self.concurrency(queued_jobs)
+        return (f"{self.mode}: {concurrency} processo(s) x {self.threads_for(concurrency)} thread(s) "
+                f"em {self.cores} núcleo(s)")
+
+
+# Estado por thread: profundidade de jobs aninhados (métricas) e threads do ffmpeg do job atual
+_job_context = threading.local()
+
+
+def _tracked_job(operation: str):
+    """Registra nas métricas do conversor uma conversão pública (só a mais externa)
+    
+    Métodos que chamam outros (segmentado caindo para convert_video, por
+    exemplo) contam uma vez só.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, input_path, output_path, *args, **kwargs):
+            depth = getattr(_job_context, 'depth', 0)
+            if depth:
+                return method(self, input_path, output_path, *args, **kwargs)
+            
+            metrics = self.metrics
+            metrics.inc('video_converter_jobs_started_total', operation=operation)
+            _job_context.depth = 1
+            start = time.perf_counter()
+            try:
+                success = method(self, input_path, output_path, *args, **kwargs)
+            finally:
+                _job_context.depth = 0
+                elapsed = time.perf_counter() - start
+            
+            metrics.inc('video_converter_encode_seconds_total', elapsed, operation=operation)
+            metrics.observe('video_converter_job_duration_seconds', elapsed, operation=operation)
+            if success:
+                metrics.inc('video_converter_jobs_succeeded_total', operation=operation)
+                # Várias saídas (convert_renditions) chegam como uma lista de dicts
+                outputs = [output_path] if isinstance(output_path, str) else [item['output'] for item in output_path]
+                try:
+                    metrics.inc('video_converter_input_bytes_total', os.path.getsize(input_path), operation=operation)
+                    metrics.inc('video_converter_output_bytes_total', sum(map(os.path.getsize, outputs)),
+                                operation=operation)
+                except OSError:
+                    pass
+                duration = self.get_video_info(input_path).get('duration') if operation != 'follow' else None
+                if duration and elapsed > 0:
+                    metrics.observe('video_converter_realtime_factor', duration / elapsed, operation=operation)
+            elif self.cancelled:
+                metrics.inc('video_converter_jobs_cancelled_total', operation=operation)
+            else:
+                metrics.inc('video_converter_jobs_failed_total', operation=operation)
+            return success
+        return wrapper
+    return decorate
+
 
 class VideoConverter:
     """Classe para conversão de diferentes formatos de vídeo e áudio"""
     
-    def __init__(self):
+    # Configurações de qualidade
+    QUALITY_SETTINGS = {
+        'low': {'crf': 28, 'preset': 'fast'},
+        'medium': {'crf': 23, 'preset': 'medium'},
+        'high': {'crf': 18, 'preset': 'slow'},
+        'best': {'crf': 15, 'preset': 'veryslow'}
+    }
+    
+    # Presets do x264/x265, do mais lento (melhor compressão) ao mais rápido
+    PRESETS = ['veryslow', 'slower', 'slow', 'medium', 'fast', 'faster', 'veryfast', 'superfast', 'ultrafast']
+    PRESET_CODECS = {'libx264', 'libx265'}
+    
+    # Codecs de áudio que cada contêiner aceita por cópia direta (sem decodificar)
+    AUDIO_COPY_CODECS = {
+        '.aac': {'aac'},
+        '.m4a': {'aac', 'alac'},
+        '.mp3': {'mp3'},
+        '.flac': {'flac'},
+        '.ogg': {'vorbis', 'opus', 'flac'},
+        '.opus': {'opus'},
+        '.wav': {'pcm_s16le', 'pcm_s24le', 'pcm_f32le'}
+    }
+    
+    # Encoder usado quando é preciso codificar
+    AUDIO_DEFAULT_ENCODERS = {
+        '.aac': 'aac',
+        '.m4a': 'aac',
+        '.mp3': 'mp3',
+        '.flac': 'flac',
+        '.ogg': 'libvorbis',
+        '.opus': 'libopus',
+        '.wav': 'pcm_s16le'
+    }
+    
+    # Nomes de encoder/atalhos -> nome do codec reportado pelo ffprobe
+    AUDIO_CODEC_ALIASES = {
+        'libmp3lame': 'mp3',
+        'libvorbis': 'vorbis',
+        'libopus': 'opus',
+        'wav': 'pcm_s16le'
+    }
+    
+    # Apenas os campos do ffprobe que realmente usamos
+    PROBE_ENTRIES = 'format=duration,size:stream=codec_type,codec_name,width,height'
+    
+    def __init__(self, cache_dir: Optional[str] = None, probe_cache: Optional[ProbeCache] = None):
+        self.cache_dir = cache_dir or os.path.join(Path.home(), '.video_converter')
+        self.probe_cache = probe_cache or ProbeCache(os.path.join(self.cache_dir, 'probe_cache.sqlite3'))
+        self.capabilities = FFmpegCapabilities(os.path.join(self.cache_dir, 'ffmpeg_capabilities.json'))
         self.supported_video_formats = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.ts', '.m2ts']
         self.supported_audio_formats = ['.mp3', '.wav', '.aac', '.flac', '.ogg', '.m4a']
+        # Codecs que o muxer MP4 aceita sem recodificação
+        self.mp4_copy_video_codecs = {'h264', 'hevc', 'av1', 'mpeg4'}
+        self.mp4_copy_audio_codecs = {'aac', 'mp3', 'alac'}
+        # Aceitos pelo muxer, mas muitos players não tocam em MP4 (opt-in)
+        self.mp4_extra_audio_codecs = {'mp2', 'opus', 'flac'}
+        # Processos ffmpeg em andamento (para cancel())
+        self._processes = set()
+        self._process_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self.batch_scheduler: Optional[JobScheduler] = None
+        # Threads por processo ffmpeg fora de um lote planejado (None = padrão do ffmpeg)
+        self.ffmpeg_threads: Optional[int] = None
+        self.metrics = ConverterMetrics()
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Gauges e contadores lidos na hora da coleta"""
+        self.metrics.gauge('video_converter_queue_depth',
+                           lambda: len(self.batch_scheduler) if self.batch_scheduler else 0)
+        self.metrics.gauge('video_converter_ffmpeg_processes', lambda: len(self._processes))
+        
+        def collect_probe_cache(metrics):
+            stats = self.probe_cache.stats()
+            metrics.set_counter('video_converter_probe_cache_hits_total', stats['memory_hits'], level='memory')
+            metrics.set_counter('video_converter_probe_cache_hits_total', stats['disk_hits'], level='disk')
+            metrics.set_counter('video_converter_probe_cache_misses_total', stats['misses'])
+        
+        self.metrics.add_collector(collect_probe_cache)
     
     def check_ffmpeg(self) -> bool:
-        """Verifica se o FFmpeg está instalado"""
+        """Verifica se o FFmpeg e o ffprobe estão instalados (descobre e guarda as capacidades)"""
+        return self.capabilities.load() is not None and shutil.which('ffprobe') is not None
+    
+    def check_job(self, output_path: str, video_codec: Optional[str] = None,
+                  audio_codec: Optional[str] = None) -> bool:
+        """Valida codecs e formato de saída contra o FFmpeg instalado antes de começar"""
+        problems = self.capabilities.problems(output_path, [video_codec, audio_codec])
+        for problem in problems:
+            print(f"Erro: {problem} no FFmpeg instalado")
+        return not problems
+    
+    # Opções do ffmpeg cujo valor é um encoder ou um grafo de filtros
+    CODEC_OPTIONS = {'-vcodec', '-acodec', '-scodec', '-c', '-codec'}
+    FILTER_OPTIONS = {'-vf', '-af', '-filter_complex', '-lavfi'}
+    
+    def _check_capabilities(self, args: List[str], output_paths: Optional[List[str]]):
+        """Recusa o comando antes de iniciar o ffmpeg se pedir algo que ele não tem"""
+        encoders = []
+        filters = []
+        for option, value in zip(args, args[1:]):
+            if option in self.CODEC_OPTIONS or option.startswith(('-c:', '-codec:')):
+                encoders.append(value)
+            elif option in self.FILTER_OPTIONS or option.startswith('-filter:'):
+                # Nome de cada filtro: após ';' ou ',' e eventuais rótulos [x]
+                filters += re.findall(r'(?:^|[;,])\s*(?:\[[^\]]*\]\s*)*([A-Za-z_]\w*)(?=[=\[;,]|$)', value)
+        
+        problems = self.capabilities.problems(None, encoders, filters)
+        for path in output_paths or []:
+            problems += self.capabilities.problems(path)
+        if problems:
+            raise FFmpegCapabilityError("FFmpeg instalado não suporta: " + "; ".join(dict.fromkeys(problems)))
+    
+    def _job_threads(self) -> Optional[int]:
+        """Threads do ffmpeg para o job desta thread (None = padrão do ffmpeg)"""
+        return getattr(_job_context, 'threads', None) or self.ffmpeg_threads
+    
+    def _compile_ffmpeg(self, output_stream, output_paths: Optional[List[str]] = None) -> List[str]:
+        """Linha de comando final: progresso em pipe:1, threads do job e validação de capacidades"""
+        output_stream = output_stream.global_args('-progress', 'pipe:1', '-nostats')
+        threads = self._job_threads()
+        if threads:
+            output_stream = output_stream.global_args('-filter_threads', str(threads))
+        args = ffmpeg.compile(output_stream, overwrite_output=True)
+        if threads:
+            # Threads de decodificação: opção de entrada, antes de cada -i
+            with_threads = []
+            for arg in args:
+                if arg == '-i':
+                    with_threads += ['-threads', str(threads)]
+                with_threads.append(arg)
+            args = with_threads
+        self._check_capabilities(args, output_paths)
+        return args
+    
+    def _run_ffmpeg(self, output_stream, duration: Optional[float] = None,
+                    progress_callback: Optional[ProgressCallback] = None,
+                    output_paths: Optional[List[str]] = None,
+                    stdin_feeder: Optional[Callable] = None):
+        """Executa o ffmpeg em um processo filho, repassando o progresso lido de -progress
+        
+        Se stdin_feeder for informado, ele roda em uma thread recebendo o
+        stdin do processo (para entradas 'pipe:0') e deve fechá-lo ao terminar.
+        """
+        if self._cancel_event.is_set():
+            raise ConversionCancelled()
+        
+        args = self._compile_ffmpeg(output_stream, output_paths)
+        
+        # stdin aberto para permitir o encerramento gracioso com 'q'
+        process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with self._process_lock:
+            self._processes.add(process)
+            # cancel() chegou enquanto o comando era montado: ele não viu este processo
+            late_cancel = self._cancel_event.is_set()
+        if late_cancel:
+            self._stop_processes([process])
+        
         try:
-            ffmpeg.probe('test')
-            return True
-        except ffmpeg.Error:
-            return True  # FFmpeg está instalado, apenas falhou no probe
-        except FileNotFoundError:
-            return False
+            # Esvaziar o stderr em paralelo para o processo nunca travar no pipe
+            stderr_tail = deque(maxlen=50)
+            stderr_thread = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+            stderr_thread.start()
+            
+            if stdin_feeder:
+                threading.Thread(target=stdin_feeder, args=(process.stdin,), daemon=True).start()
+            
+            fields = {}
+            for raw_line in process.stdout:
+                key, _, value = raw_line.decode('utf-8', 'replace').strip().partition('=')
+                if not key:
+                    continue
+                fields[key] = value
+                if key == 'progress':
+                    if progress_callback and not self._cancel_event.is_set():
+                        progress_callback(_parse_progress(fields, duration))
+                    fields = {}
+            
+            returncode = process.wait()
+            stderr_thread.join()
+        finally:
+            if process.poll() is None:
+                # Callback de progresso falhou ou a leitura foi interrompida: não deixar o ffmpeg órfão
+                process.kill()
+                process.wait()
+            with self._process_lock:
+                self._processes.discard(process)
+        
+        if getattr(process, 'interrupted', False):
+            # Saída parcial não serve para nada
+            for path in output_paths or []:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise ConversionCancelled()
+        
+        if returncode != 0:
+            raise ffmpeg.Error('ffmpeg', None, b''.join(stderr_tail))
+    
+    def cancel(self, timeout: float = 0.5):
+        """Interrompe as conversões em andamento ('q' primeiro, depois terminate/kill)"""
+        self._cancel_event.set()
+        
+        with self._process_lock:
+            processes = list(self._processes)
+        self._stop_processes(processes, timeout)
+    
+    @staticmethod
+    def _stop_processes(processes: List[subprocess.Popen], timeout: float = 0.5):
+        """Encerra processos ffmpeg e marca os que ainda rodavam como interrompidos"""
+        for process in processes:
+            if process.poll() is not None:
+                continue  # Já tinha terminado sozinho: a saída é válida
+            process.interrupted = True
+            try:
+                process.stdin.write(b'q')
+                process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+        
+        # Dar ao ffmpeg um instante para sair sozinho antes de forçar
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.terminate()
+        
+        for process in processes:
+            try:
+                process.wait(0.3)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    
+    def reset_cancel(self):
+        """Permite novas conversões depois de um cancel()"""
+        self._cancel_event.clear()
+    
+    @property
+    def cancelled(self) -> bool:
+        """Indica se cancel() foi chamado desde o último reset_cancel()"""
+        return self._cancel_event.is_set()
+    
+    def _duration_for_progress(self, input_path: str,
+                               progress_callback: Optional[ProgressCallback]) -> Optional[float]:
+        """Obtém a duração só quando alguém vai acompanhar o progresso"""
+        if not progress_callback:
+            return None
+        return self.get_video_info(input_path).get('duration')
     
     def get_video_info(self, input_path: str) -> dict:
-        """Obtém informações do vídeo"""
-        try:
-            probe = ffmpeg.probe(input_path)
-            video_info = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-            audio_info = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-            
-            return {
-                'duration': float(probe['format']['duration']),
-                'size': int(probe['format']['size']),
-                'video_codec': video_info['codec_name'] if video_info else None,
-                'audio_codec': audio_info['codec_name'] if audio_info else None,
-                'width': int(video_info['width']) if video_info else None,
-                'height': int(video_info['height']) if video_info else None
-            }
+        """Obtém informações do vídeo (usando o cache de probe)"""
+        try:
+            key = ProbeCache.file_key(input_path)
+            info = self.probe_cache.get(key)
+            if info is None:
+                start = time.perf_counter()
+                info = self._probe(input_path)
+                self.metrics.observe('video_converter_probe_duration_seconds', time.perf_counter() - start)
+                self.probe_cache.put(key, info)
+            return info
         except Exception as e:
             print(f"Erro ao obter informações do vídeo: {e}")
             return {}
     
+    def _probe_args(self, input_path: str) -> List[str]:
+        """ffprobe pedindo só as entradas necessárias"""
+        return ['ffprobe', '-v', 'error', '-show_entries', self.PROBE_ENTRIES, '-of', 'json', input_path]
+    
+    def _probe(self, input_path: str) -> dict:
+        """Executa o ffprobe e resume a saída"""
+        result = subprocess.run(self._probe_args(input_path), capture_output=True)
+        if result.returncode != 0:
+            raise ffmpeg.Error('ffprobe', result.stdout, result.stderr)
+        return self._parse_probe(result.stdout)
+    
+    @staticmethod
+    def _parse_probe(output: bytes) -> dict:
+        probe = json.loads(output.decode('utf-8', 'replace'))
+        streams = probe.get('streams', [])
+        video_info = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+        audio_info = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        
+        return {
+            'duration': float(probe['format']['duration']),
+            'size': int(probe['format']['size']),
+            'video_codec': video_info['codec_name'] if video_info else None,
+            'audio_codec': audio_info['codec_name'] if audio_info else None,
+            'width': int(video_info['width']) if video_info else None,
+            'height': int(video_info['height']) if video_info else None
+        }
+    
+    def _video_output_args(self, video_codec: str, quality: str,
+                           resolution: Optional[str] = None, preset: Optional[str] = None) -> dict:
+        """Argumentos de saída de vídeo para a qualidade e resolução escolhidas"""
+        settings = self.QUALITY_SETTINGS.get(quality, self.QUALITY_SETTINGS['medium'])
+        
+        output_args = {
+            'vcodec': video_codec,
+            'crf': settings['crf'],
+            'preset': preset or settings['preset']
+        }
+        
+        threads = self._job_threads()
+        if threads:
+            output_args['threads'] = threads
+        
+        # Adicionar resolução se especificada
+        if resolution:
+            width, height = map(int, resolution.split('x'))
+            output_args['s'] = f'{width}x{height}'
+        
+        return output_args
+    
+    def _convert_video_stream(self, input_path: str, output_path: str, video_codec: str = 'libx264',
+                              audio_codec: str = 'aac', quality: str = 'medium',
+                              resolution: Optional[str] = None, preset: Optional[str] = None,
+                              comment: Optional[str] = None):
+        """Saída do ffmpeg usada por convert_video"""
+        input_stream = ffmpeg.input(input_path)
+        
+        # Configurar stream de saída
+        output_args = self._video_output_args(video_codec, quality, resolution, preset)
+        output_args['acodec'] = audio_codec
+        if comment:
+            output_args['metadata'] = f'comment={comment}'
+        
+        return ffmpeg.output(input_stream, output_path, **output_args)
+    
+    @_tracked_job('convert_video')
     def convert_video(self, input_path: str, output_path: str, 
                      video_codec: str = 'libx264', audio_codec: str = 'aac',
-                     quality: str = 'medium', resolution: Optional[str] = None) -> bool:
-        """Converte vídeo para outro formato"""
+                     quality: str = 'medium', resolution: Optional[str] = None,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     preset: Optional[str] = None, comment: Optional[str] = None) -> bool:
+        """Converte vídeo para outro formato (preset substitui o da qualidade escolhida)"""
         try:
-            input_stream = ffmpeg.input(input_path)
+            output_stream = self._convert_video_stream(input_path, output_path, video_codec, audio_codec,
+                                                       quality, resolution, preset, comment)
             
-            # Configurações de qualidade
-            quality_settings = {
-                'low': {'crf': 28, 'preset': 'fast'},
-                'medium': {'crf': 23, 'preset': 'medium'},
-                'high': {'crf': 18, 'preset': 'slow'},
-                'best': {'crf': 15, 'preset': 'veryslow'}
-            }
+            # Executar conversão
+            duration = self._duration_for_progress(input_path, progress_callback)
+            self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
+            return True
             
-            settings = quality_settings.get(quality, quality_settings['medium'])
+        except Exception as e:
+            print(f"Erro na conversão: {e}")
+            return False
+    
+    def _sample_speed(self, input_path: str, preset: str, positions: List[float], sample_seconds: float,
+                      video_codec: str, quality: str, resolution: Optional[str]) -> float:
+        """Codifica trechos curtos (sem gravar saída) e retorna o fator de tempo real obtido"""
+        output_args = self._video_output_args(video_codec, quality, resolution, preset)
+        media = 0.0
+        wall = 0.0
+        for position in positions:
+            stream = ffmpeg.input(input_path, ss=position, t=sample_seconds)
+            stream = ffmpeg.output(stream['v:0'], '-', format='null', **output_args)
+            start = time.perf_counter()
+            self._run_ffmpeg(stream)
+            wall += time.perf_counter() - start
+            media += sample_seconds
+        return media / wall if wall > 0 else float('inf')
+    
+    def choose_preset(self, input_path: str, target_speed: float, video_codec: str = 'libx264',
+                      quality: str = 'medium', resolution: Optional[str] = None,
+                      samples: int = 3, sample_seconds: float = 5.0) -> dict:
+        """Escolhe o preset mais lento que ainda codifica a pelo menos target_speed x tempo real
+        
+        Mede a velocidade com trechos curtos espalhados pelo arquivo. Como a
+        velocidade cresce com o preset, uma busca binária testa só 3 ou 4
+        presets. Retorna a decisão: preset, velocidades medidas e se a meta
+        foi atingida.
+        """
+        duration = self.get_video_info(input_path).get('duration') or 0.0
+        sample_seconds = min(sample_seconds, duration / max(1, samples)) if duration else sample_seconds
+        # Trechos igualmente espaçados (25/50/75% com 3 amostras), longe de vinhetas de abertura e encerramento
+        positions = [duration * (index + 1) / (samples + 1) for index in range(samples)] if duration else [0.0]
+        
+        measured = {}
+        low, high = 0, len(self.PRESETS) - 1
+        chosen = high
+        while low <= high:
+            middle = (low + high) // 2
+            preset = self.PRESETS[middle]
+            measured[preset] = self._sample_speed(input_path, preset, positions, sample_seconds,
+                                                  video_codec, quality, resolution)
+            if measured[preset] >= target_speed:
+                chosen = middle
+                high = middle - 1
+            else:
+                low = middle + 1
+        
+        preset = self.PRESETS[chosen]
+        if preset not in measured:
+            measured[preset] = self._sample_speed(input_path, preset, positions, sample_seconds,
+                                                  video_codec, quality, resolution)
+        return {
+            'preset': preset,
+            'target_speed': target_speed,
+            'expected_speed': measured[preset],
+            'met': measured[preset] >= target_speed,
+            'measured': measured
+        }
+    
+    def convert_video_with_budget(self, input_path: str, output_path: str, budget: SpeedBudget,
+                                  video_codec: str = 'libx264', audio_codec: str = 'aac',
+                                  quality: str = 'medium', resolution: Optional[str] = None,
+                                  progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """Converte escolhendo o preset pela meta de velocidade; a decisão vai no log e nos metadados"""
+        target_speed = budget.target_speed()
+        if not target_speed or video_codec not in self.PRESET_CODECS:
+            return self.convert_video(input_path, output_path, video_codec, audio_codec,
+                                      quality, resolution, progress_callback)
+        
+        try:
+            if target_speed == float('inf'):
+                decision = {'preset': self.PRESETS[-1], 'target_speed': target_speed,
+                            'expected_speed': None, 'met': False, 'measured': {}}
+            else:
+                decision = self.choose_preset(input_path, target_speed, video_codec, quality, resolution)
+        except ConversionCancelled:
+            return False
+        except Exception as e:
+            print(f"Erro ao medir presets, usando o da qualidade '{quality}': {e}")
+            return self.convert_video(input_path, output_path, video_codec, audio_codec,
+                                      quality, resolution, progress_callback)
+        
+        expected = f"{decision['expected_speed']:.2f}x" if decision['expected_speed'] else 'n/d'
+        summary = (f"preset={decision['preset']} meta={target_speed:.2f}x "
+                   f"esperado={expected} {'ok' if decision['met'] else 'meta inatingível'}")
+        measured = ', '.join(f"{preset} {speed:.2f}x" for preset, speed in decision['measured'].items())
+        print(f"Orçamento de velocidade ({Path(input_path).name}): {summary} [medidos: {measured}]")
+        
+        return self.convert_video(input_path, output_path, video_codec, audio_codec, quality,
+                                  resolution, progress_callback, preset=decision['preset'],
+                                  comment=f"video_converter speed budget: {summary}")
+    
+    @_tracked_job('segmented')
+    def convert_video_segmented(self, input_path: str, output_path: str,
+                                segments: Optional[int] = None, workers: Optional[int] = None,
+                                video_codec: str = 'libx264', audio_codec: str = 'aac',
+                                quality: str = 'medium', resolution: Optional[str] = None,
+                                min_segment_seconds: float = 30.0,
+                                progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """Converte um vídeo longo dividindo-o em trechos codificados em paralelo
+        
+        O vídeo é cortado em keyframes (cópia de stream), cada trecho é
+        codificado em um processo ffmpeg próprio e os trechos são unidos sem
+        perdas com o demuxer concat. O áudio é codificado uma única vez, em
+        paralelo com os trechos, para não criar lacunas nas emendas.
+        """
+        info = self.get_video_info(input_path)
+        duration = info.get('duration')
+        cpu_count = os.cpu_count() or 1
+        segments = segments or cpu_count
+        if duration:
+            segments = min(segments, int(duration // min_segment_seconds))
+        
+        if not info.get('video_codec') or segments < 2:
+            # Curto demais (ou sem vídeo) para compensar a divisão
+            return self.convert_video(input_path, output_path, video_codec, audio_codec,
+                                      quality, resolution, progress_callback)
+        
+        workers = max(1, min(workers or segments, segments))
+        work_dir = tempfile.mkdtemp(prefix='.segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+        
+        try:
+            start = time.perf_counter()
             
-            # Configurar stream de saída
-            output_args = {
-                'vcodec': video_codec,
-                'acodec': audio_codec,
-                'crf': settings['crf'],
-                'preset': settings['preset']
-            }
+            # 1. Cortar o vídeo em keyframes, sem recodificar
+            print(f"Dividindo {os.path.basename(input_path)} em ~{segments} trechos...")
+            split_stream = ffmpeg.input(input_path)['v:0'].output(
+                os.path.join(work_dir, 'chunk_%04d.mkv'),
+                c='copy', f='segment', segment_time=f'{duration / segments:.3f}', reset_timestamps=1
+            )
+            self._run_ffmpeg(split_stream)
+            chunks = sorted(str(p) for p in Path(work_dir).glob('chunk_*.mkv'))
             
-            # Adicionar resolução se especificada
-            if resolution:
-                width, height = map(int, resolution.split('x'))
-                output_args['s'] = f'{width}x{height}'
+            # 2. Codificar trechos (e o áudio) em paralelo
+            output_args = self._video_output_args(video_codec, quality, resolution)
+            output_args['threads'] = ThreadBudget(cpu_count, 'auto').threads_for(workers)
+            chunk_progress = {}
+            progress_lock = threading.Lock()
             
-            output_stream = ffmpeg.output(input_stream, output_path, **output_args)
+            def report(name):
+                def on_progress(event):
+                    if not progress_callback:
+                        return
+                    with progress_lock:
+                        chunk_progress[name] = event['out_time']
+                        out_time = min(sum(chunk_progress.values()), duration)
+                    elapsed = time.perf_counter() - start
+                    speed = out_time / elapsed if elapsed > 0 else None
+                    progress_callback({
+                        'out_time': out_time,
+                        'fps': None,
+                        'speed': speed,
+                        'bitrate': None,
+                        'eta': (duration - out_time) / speed if speed else None,
+                        'percent': out_time / duration * 100,
+                        'duration': duration,
+                        'done': False
+                    })
+                return on_progress
             
-            # Executar conversão
-            ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
+            encoded_chunks = []
+            tasks = []
+            for chunk in chunks:
+                encoded = chunk.replace('chunk_', 'encoded_')
+                encoded_chunks.append(encoded)
+                stream = ffmpeg.input(chunk).output(encoded, an=None, **output_args)
+                tasks.append((stream, [encoded], report(chunk)))
+            
+            audio_file = None
+            if info.get('audio_codec'):
+                audio_file = os.path.join(work_dir, 'audio.mka')
+                stream = ffmpeg.input(input_path)['a:0'].output(audio_file, acodec=audio_codec)
+                tasks.append((stream, [audio_file], None))
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._run_ffmpeg, stream, None, callback, outputs)
+                           for stream, outputs, callback in tasks]
+                for future in as_completed(futures):
+                    future.result()
+            
+            # 3. Unir os trechos sem recodificar
+            list_file = os.path.join(work_dir, 'concat.txt')
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for encoded in encoded_chunks:
+                    escaped = encoded.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            
+            # Os trechos começam em zero; restaurar o atraso original do vídeo em relação ao áudio
+            concat_args = {'f': 'concat', 'safe': 0}
+            video_offset = self._video_start_offset(input_path)
+            if video_offset > 0.001:
+                concat_args['itsoffset'] = f'{video_offset:.6f}'
+            
+            streams = [ffmpeg.input(list_file, **concat_args)['v']]
+            if audio_file:
+                streams.append(ffmpeg.input(audio_file)['a'])
+            
+            mux_args = {'c': 'copy'}
+            if Path(output_path).suffix.lower() in ('.mp4', '.mov', '.m4v'):
+                mux_args['movflags'] = 'faststart'
+            self._run_ffmpeg(ffmpeg.output(*streams, output_path, **mux_args), output_paths=[output_path])
+            
+            # 4. Conferir se a duração bate com a da entrada
+            output_duration = self.get_video_info(output_path).get('duration') or 0
+            drift = abs(output_duration - duration)
+            elapsed = time.perf_counter() - start
+            print(f"Segmentado: {len(chunks)} trechos, {workers} worker(s), {elapsed:.1f}s "
+                  f"(duração {output_duration:.2f}s / entrada {duration:.2f}s)")
+            if drift > 0.5:
+                # Emendas fora de sincronia: a saída não é confiável, refazer numa passada só
+                print(f"⚠️ Diferença de duração de {drift:.2f}s entre entrada ({duration:.2f}s) e saída "
+                      f"({output_duration:.2f}s); convertendo de novo sem dividir")
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+                return self.convert_video(input_path, output_path, video_codec, audio_codec,
+                                          quality, resolution, progress_callback)
+            
+            if progress_callback:
+                progress_callback({
+                    'out_time': duration, 'fps': None, 'speed': duration / elapsed if elapsed > 0 else None,
+                    'bitrate': None, 'eta': 0.0, 'percent': 100.0, 'duration': duration, 'done': True
+                })
             return True
             
         except Exception as e:
-            print(f"Erro na conversão: {e}")
+            print(f"Erro na conversão segmentada: {e}")
             return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _video_start_offset(self, input_path: str) -> float:
+        """Atraso (s) do primeiro quadro de vídeo em relação ao início do arquivo"""
+        args = ['ffprobe', '-v', 'error', '-show_entries', 'format=start_time:stream=codec_type,start_time',
+                '-of', 'json', input_path]
+        try:
+            probe = json.loads(subprocess.run(args, capture_output=True).stdout or b'{}')
+            format_start = float(probe['format']['start_time'])
+            video = next(stream for stream in probe['streams'] if stream.get('codec_type') == 'video')
+            return max(float(video['start_time']) - format_start, 0.0)
+        except (KeyError, StopIteration, ValueError):
+            return 0.0
     
+    def plan_audio(self, input_path: str, output_path: str,
+                   audio_codec: Optional[str] = None) -> dict:
+        """Decide se o áudio pode ser copiado para o contêiner de saída ou precisa ser codificado"""
+        extension = Path(output_path).suffix.lower()
+        source_codec = self.get_video_info(input_path).get('audio_codec')
+        requested = self.AUDIO_CODEC_ALIASES.get(audio_codec, audio_codec)
+        
+        copy = (source_codec in self.AUDIO_COPY_CODECS.get(extension, ())
+                and (requested is None or requested == source_codec))
+        encoder = audio_codec or self.AUDIO_DEFAULT_ENCODERS.get(extension, 'mp3')
+        if encoder == 'wav':
+            encoder = 'pcm_s16le'  # As GUIs passam o formato 'wav' como codec
+        
+        return {
+            'mode': 'copy' if copy else 'encode',
+            'source_codec': source_codec,
+            'codec': source_codec if copy else self.AUDIO_CODEC_ALIASES.get(encoder, encoder),
+            'encoder': 'copy' if copy else encoder
+        }
+    
+    @staticmethod
+    def _audio_output_args(plan: dict, output_path: str, bitrate: str) -> dict:
+        """Argumentos de saída só de áudio para o plano de plan_audio()"""
+        if plan['mode'] == 'copy':
+            audio_settings = {'acodec': 'copy'}
+            if plan['source_codec'] == 'aac' and Path(output_path).suffix.lower() == '.m4a':
+                audio_settings['bsf:a'] = 'aac_adtstoasc'  # ADTS (TS) -> MP4
+        else:
+            audio_settings = {'acodec': plan['encoder'], 'ab': bitrate}
+        audio_settings['vn'] = None  # Remove vídeo
+        return audio_settings
+    
+    def _audio_stream(self, input_path: str, output_path: str, audio_codec: Optional[str] = None,
+                      bitrate: str = '192k', allow_copy: bool = True) -> tuple:
+        """Saída do ffmpeg e plano de áudio usados por convert_to_audio"""
+        input_stream = ffmpeg.input(input_path)
+        
+        plan = self.plan_audio(input_path, output_path, audio_codec)
+        if not allow_copy and plan['mode'] == 'copy':
+            encoder = audio_codec or self.AUDIO_DEFAULT_ENCODERS.get(Path(output_path).suffix.lower(), 'mp3')
+            plan.update(mode='encode', codec=plan['source_codec'], encoder=encoder)
+        
+        audio_settings = self._audio_output_args(plan, output_path, bitrate)
+        source = input_stream['a:0'] if plan['source_codec'] else input_stream
+        return ffmpeg.output(source, output_path, **audio_settings), plan
+    
+    @staticmethod
+    def _audio_done_message(plan: dict, output_path: str) -> str:
+        if plan['mode'] == 'copy':
+            return f"Áudio copiado sem recodificação ({plan['codec']}): {os.path.basename(output_path)}"
+        return f"Áudio codificado ({plan['source_codec'] or '?'} -> {plan['codec']}): {os.path.basename(output_path)}"
+    
+    @_tracked_job('audio')
     def convert_to_audio(self, input_path: str, output_path: str, 
-                        audio_codec: str = 'mp3', bitrate: str = '192k') -> bool:
-        """Converte vídeo para áudio"""
+                        audio_codec: Optional[str] = None, bitrate: str = '192k',
+                        allow_copy: bool = True,
+                        progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """Converte vídeo para áudio (copiando o stream quando o contêiner aceita o codec original)
+        
+        Sem audio_codec, o encoder é escolhido pela extensão da saída.
+        """
         try:
+            output_stream, plan = self._audio_stream(input_path, output_path, audio_codec, bitrate, allow_copy)
+            duration = self._duration_for_progress(input_path, progress_callback)
+            self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
+            print(self._audio_done_message(plan, output_path))
+            return True
+            
+        except Exception as e:
+            print(f"Erro na conversão para áudio: {e}")
+            return False
+    
+    @classmethod
+    def parse_rendition(cls, text: str) -> dict:
+        """Lê uma saída da linha de comando: 'arquivo[,LARGURAxALTURA][,qualidade][,audio]'"""
+        fields = [field.strip() for field in text.split(',')]
+        if not fields[0]:
+            raise ValueError(f"Saída sem nome de arquivo: {text}")
+        rendition = {'output': fields[0]}
+        for field in fields[1:]:
+            if re.fullmatch(r'\d+x\d+', field):
+                rendition['resolution'] = field
+            elif field in cls.QUALITY_SETTINGS:
+                rendition['quality'] = field
+            elif field == 'audio':
+                rendition['audio_only'] = True
+            else:
+                raise ValueError(f"Campo desconhecido '{field}' em {text}")
+        return rendition
+    
+    def is_audio_rendition(self, rendition: dict) -> bool:
+        return bool(rendition.get('audio_only')) or \
+            Path(rendition['output']).suffix.lower() in self.AUDIO_DEFAULT_ENCODERS
+    
+    @_tracked_job('renditions')
+    def convert_renditions(self, input_path: str, renditions: List[dict],
+                           video_codec: str = 'libx264', audio_codec: str = 'aac',
+                           progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """Gera várias saídas de uma entrada com um único ffmpeg, que lê e decodifica uma vez
+        
+        Cada saída é um dict com 'output' e, opcionalmente, 'resolution',
+        'quality', 'audio_only', 'video_codec', 'audio_codec' e 'bitrate'
+        (saídas .mp3/.m4a/... são só áudio). O vídeo decodificado passa por
+        um filtro split, com a escala de cada saída, e o áudio decodificado
+        alimenta todos os encoders.
+        """
+        if not renditions:
+            print("Nenhuma saída informada")
+            return False
+        try:
+            info = self.get_video_info(input_path)
             input_stream = ffmpeg.input(input_path)
+            audio = input_stream['a:0'] if info.get('audio_codec') else None
             
-            # Configurações de áudio
-            audio_settings = {
-                'acodec': audio_codec,
-                'ab': bitrate,
-                'vn': None  # Remove vídeo
-            }
+            video_count = sum(1 for rendition in renditions if not self.is_audio_rendition(rendition))
+            if video_count and not info.get('video_codec'):
+                print(f"Sem stream de vídeo em {os.path.basename(input_path)}")
+                return False
+            split = input_stream['v:0'].split() if video_count > 1 else None
+            branches = iter(range(video_count))
+            
+            outputs = []
+            for rendition in renditions:
+                path = rendition['output']
+                if self.is_audio_rendition(rendition):
+                    if audio is None:
+                        print(f"Sem stream de áudio para {os.path.basename(path)}")
+                        return False
+                    plan = self.plan_audio(input_path, path, rendition.get('audio_codec'))
+                    output_args = self._audio_output_args(plan, path, rendition.get('bitrate', '192k'))
+                    outputs.append(ffmpeg.output(audio, path, **output_args))
+                    continue
+                
+                video = split[next(branches)] if split else input_stream['v:0']
+                if rendition.get('resolution'):
+                    width, height = map(int, rendition['resolution'].split('x'))
+                    video = video.filter('scale', width, height)
+                output_args = self._video_output_args(rendition.get('video_codec', video_codec),
+                                                      rendition.get('quality', 'medium'))
+                streams = [video]
+                if audio is not None:
+                    streams.append(audio)
+                    output_args['acodec'] = rendition.get('audio_codec', audio_codec)
+                outputs.append(ffmpeg.output(*streams, path, **output_args))
             
-            output_stream = ffmpeg.output(input_stream, output_path, **audio_settings)
-            ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
+            duration = self._duration_for_progress(input_path, progress_callback)
+            self._run_ffmpeg(ffmpeg.merge_outputs(*outputs), duration, progress_callback,
+                             [rendition['output'] for rendition in renditions])
+            for rendition in renditions:
+                print(f"✓ {os.path.basename(rendition['output'])}")
             return True
             
         except Exception as e:
-            print(f"Erro na conversão para áudio: {e}")
+            print(f"Erro na conversão em várias saídas: {e}")
             return False
     
     def batch_convert(self, input_dir: str, output_dir: str, 
-                     output_format: str = 'mp4', quality: str = 'medium') -> List[str]:
-        """Conversão em lote de vídeos"""
-        input_path = Path(input_dir)
-        output_path = Path(output_dir)
-        output_path.mkdir(exist_ok=True)
+                     output_format: str = 'mp4', quality: str = 'medium',
+                     workers: int = 1, incremental: bool = False,
+                     recursive: bool = False, scan_workers: int = 1,
+                     speed_target: Optional[float] = None, deadline: Optional[str] = None,
+                     policy: str = 'fifo', priorities: Optional[dict] = None,
+                     thread_mode: Optional[str] = None) -> List[str]:
+        """Conversão em lote de vídeos (workers > 1 converte em paralelo)
+        
+        Com policy='fifo' os arquivos entram na fila à medida que a varredura
+        os encontra, então a primeira conversão começa antes de a varredura
+        terminar; 'longest' e 'shortest' ordenam pelo custo estimado (ver
+        JobScheduler) depois de varrer tudo. priorities mapeia padrões de nome
+        ('final*.ts') para prioridades; o arquivo .prioridades na pasta de saída
+        (linhas "padrão [prioridade]") é relido durante o lote, e
+        self.batch_scheduler aceita set_priority() de outra thread.
+        Com incremental=True, arquivos já convertidos com as mesmas
+        configurações (segundo o diário da pasta de saída) são pulados.
+        Com speed_target (fator de tempo real) ou deadline ('06:00'), o preset
+        de cada arquivo é escolhido por amostragem para cumprir a meta.
+        Com thread_mode ('auto', 'latency', 'throughput'), um ThreadBudget
+        decide quantos jobs rodam juntos (substituindo workers) e quantos
+        threads cada ffmpeg usa.
+        """
+        # Codec ou formato sem suporte falha aqui, e não no meio do lote
+        if not self.check_job(f"saida.{output_format}", 'libx264', 'aac'):
+            return []
+        
+        thread_budget = ThreadBudget(mode=thread_mode) if thread_mode else None
+        if thread_budget:
+            workers = thread_budget.concurrency()
+            print(f"Orçamento de threads: {thread_budget.describe()}")
+        
+        input_path = Path(input_dir).resolve()
+        output_path = Path(output_dir).resolve()
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        settings = {'output_format': output_format, 'quality': quality}
+        journal = ConversionJournal(str(output_path)) if incremental else None
+        budget = SpeedBudget(speed_target, deadline, workers) if speed_target or deadline else None
+        scheduler = JobScheduler(policy)
+        self.batch_scheduler = scheduler
+        priority_file = output_path / '.prioridades'
+        priority_state = {'mtime': None, 'base': list((priorities or {}).items())}
+        priority_state['rules'] = priority_state['base']
         
         converted_files = []
+        failures = 0
+        skipped = 0
+        running = 0
+        results_lock = threading.Lock()
+        start = time.perf_counter()
+        start_cpu = self._children_cpu_time()
         
-        for file_path in input_path.iterdir():
-            if file_path.suffix.lower() in self.supported_video_formats:
-                output_file = output_path / f"{file_path.stem}.{output_format}"
+        def worker():
+            nonlocal failures, running
+            while True:
+                self._reload_priorities(scheduler, priority_file, priority_state)
+                job = scheduler.get()
+                if job is None:
+                    break
+                file_path, output_file, queued_at = job
+                self.metrics.observe('video_converter_queue_wait_seconds', time.monotonic() - queued_at)
+                with results_lock:
+                    running += 1
+                    pending = running + len(scheduler)
+                if thread_budget:
+                    _job_context.threads = thread_budget.threads_for(pending)
+                try:
+                    success, elapsed = self._convert_job(file_path, output_file, quality, journal, settings, budget)
+                except Exception as e:
+                    print(f"Erro inesperado em {file_path.name}: {e}")
+                    success, elapsed = False, 0.0
+                finally:
+                    _job_context.threads = None
                 
-                print(f"Convertendo: {file_path.name} -> {output_file.name}")
+                with results_lock:
+                    running -= 1
+                    if success:
+                        converted_files.append(str(output_file))
+                        print(f"✓ Sucesso: {output_file.name} ({elapsed:.1f}s)")
+                    else:
+                        failures += 1
+                        print(f"✗ Falha: {file_path.name}")
+        
+        # Cada conversão é um processo ffmpeg separado, então threads bastam
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+        
+        try:
+            files = scan_media_files(str(input_path), self.supported_video_formats, recursive=recursive,
+                                     workers=scan_workers, exclude=[str(output_path)])
+            for entry in files:
+                file_path = Path(entry.path)
+                # Subpastas são espelhadas na saída para evitar colisão de nomes
+                relative_dir = file_path.parent.relative_to(input_path)
+                output_file = output_path / relative_dir / f"{file_path.stem}.{output_format}"
                 
-                if self.convert_video(str(file_path), str(output_file), quality=quality):
-                    converted_files.append(str(output_file))
-                    print(f"✓ Sucesso: {output_file.name}")
-                else:
-                    print(f"✗ Falha: {file_path.name}")
+                if journal and journal.is_up_to_date(str(file_path), str(output_file), settings, entry.stat()):
+                    skipped += 1
+                    continue
+                
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                cost = 0.0
+                if budget or policy != 'fifo':
+                    info = self.get_video_info(str(file_path))
+                    cost = JobScheduler.estimate_cost(info)
+                    if budget:
+                        budget.add(info.get('duration') or 0.0)
+                priority = self._priority_for(file_path.name, priority_state['rules'])
+                scheduler.put(str(file_path), (file_path, output_file, time.monotonic()), cost, priority)
+        finally:
+            scheduler.close()
+            for thread in threads:
+                thread.join()
+            self.batch_scheduler = None
+            self.probe_cache.flush()
+        
+        wall_time = time.perf_counter() - start
+        print(f"\nResumo: {len(converted_files)} convertidos, {failures} falhas, "
+              f"{skipped} já atualizados, {workers} worker(s)")
+        # Somar o tempo de parede dos jobs daria a concorrência média, não um ganho sobre o serial;
+        # o speedup real sobre o serial é medido por benchmark_converter.py --batch-workers N
+        child_cpu = self._children_cpu_time()
+        if child_cpu is None:
+            print(f"Tempo total: {wall_time:.1f}s")
+        else:
+            print(f"Tempo total: {wall_time:.1f}s (CPU dos processos ffmpeg/ffprobe: "
+                  f"{child_cpu - start_cpu:.1f}s)")
         
         return converted_files
     
-    def ts_to_mp4_optimized(self, input_path: str, output_path: str) -> bool:
-        """Conversão otimizada específica para .ts -> .mp4"""
+    @staticmethod
+    def _children_cpu_time() -> Optional[float]:
+        """CPU (usuário + sistema) dos processos filhos já encerrados; None sem o módulo resource"""
+        if resource is None:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+    
+    @staticmethod
+    def _priority_for(name: str, rules: List[tuple]) -> int:
+        """Maior prioridade entre as regras (padrão, prioridade) que casam com o nome"""
+        return max((priority for pattern, priority in rules if fnmatch.fnmatch(name, pattern)), default=0)
+    
+    def _reload_priorities(self, scheduler: JobScheduler, priority_file: Path, state: dict):
+        """Relê o arquivo .prioridades se mudou e reprioriza os jobs pendentes"""
         try:
-            input_stream = ffmpeg.input(input_path)
+            mtime = priority_file.stat().st_mtime_ns
+        except OSError:
+            return
+        
+        # Vários workers chegam aqui juntos: uma recarga por vez, sem intercalar com get()
+        with scheduler.lock:
+            if mtime == state['mtime']:
+                return
+            state['mtime'] = mtime
             
-            # Configurações otimizadas para TS -> MP4
-            output_stream = ffmpeg.output(
-                input_stream, 
-                output_path,
-                vcodec='libx264',
-                acodec='aac',
-                preset='medium',
-                crf=23,
-                movflags='faststart'  # Otimização para streaming
-            )
+            rules = []
+            for line in priority_file.read_text(encoding='utf-8').splitlines():
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                rules.append((parts[0], int(parts[1]) if len(parts) > 1 and parts[1].lstrip('-').isdigit() else 10))
+            state['rules'] = state['base'] + rules
+            
+            for key in scheduler.pending_keys():
+                scheduler.set_priority(key, self._priority_for(os.path.basename(key), state['rules']))
+        print(f"Prioridades atualizadas ({len(rules)} regra(s))")
+    
+    def _convert_job(self, file_path: Path, output_file: Path, quality: str,
+                     journal: Optional[ConversionJournal] = None, settings: Optional[dict] = None,
+                     budget: Optional[SpeedBudget] = None):
+        """Converte um arquivo do lote e retorna (sucesso, tempo gasto)"""
+        if self.cancelled:
+            return False, 0.0
+        
+        print(f"Convertendo: {file_path.name} -> {output_file.name}")
+        if journal:
+            journal.mark_started(str(file_path), str(output_file), settings)
+        
+        start = time.perf_counter()
+        if budget:
+            success = self.convert_video_with_budget(str(file_path), str(output_file), budget, quality=quality)
+            budget.done(self.get_video_info(str(file_path)).get('duration') or 0.0)
+        else:
+            success = self.convert_video(str(file_path), str(output_file), quality=quality)
+        elapsed = time.perf_counter() - start
+        
+        if journal:
+            journal.mark_finished(str(file_path), str(output_file), settings, success)
+        return success, elapsed
+    
+    def plan_ts_to_mp4(self, input_path: str, allow_ac3: bool = False, allow_extra_audio: bool = False) -> dict:
+        """Decide, por stream, se é possível copiar (remux) ou se é preciso recodificar"""
+        info = self.get_video_info(input_path)
+        audio_codecs = set(self.mp4_copy_audio_codecs)
+        if allow_ac3:
+            audio_codecs |= {'ac3', 'eac3'}
+        if allow_extra_audio:
+            audio_codecs |= self.mp4_extra_audio_codecs
+        
+        video_codec = info.get('video_codec')
+        audio_codec = info.get('audio_codec')
+        
+        plan = {'info': info, 'video': 'libx264', 'audio': 'aac'}
+        
+        if info:
+            if not video_codec:
+                plan['video'] = None
+            elif video_codec in self.mp4_copy_video_codecs:
+                plan['video'] = 'copy'
+            
+            if not audio_codec:
+                plan['audio'] = None
+            elif audio_codec in audio_codecs:
+                plan['audio'] = 'copy'
+        
+        actions = [action for action in (plan['video'], plan['audio']) if action]
+        if actions and all(action == 'copy' for action in actions):
+            plan['mode'] = 'remux'
+        elif 'copy' in actions:
+            plan['mode'] = 'parcial'
+        else:
+            plan['mode'] = 'transcode'
+        return plan
+    
+    def _ts_to_mp4_stream(self, input_path: str, output_path: str, allow_ac3: bool = False,
+                          force_transcode: bool = False, allow_extra_audio: bool = False) -> tuple:
+        """Saída do ffmpeg e plano usados por ts_to_mp4_optimized"""
+        input_stream = ffmpeg.input(input_path)
+        
+        if force_transcode:
+            plan = {'info': {}, 'video': 'libx264', 'audio': 'aac', 'mode': 'transcode'}
+        else:
+            plan = self.plan_ts_to_mp4(input_path, allow_ac3=allow_ac3, allow_extra_audio=allow_extra_audio)
+        
+        output_args = {'movflags': 'faststart'}  # Otimização para streaming
+        
+        if plan['video'] == 'copy':
+            output_args['vcodec'] = 'copy'
+        elif plan['video']:
+            output_args.update({'vcodec': 'libx264', 'preset': 'medium', 'crf': 23})
+        
+        if plan['audio'] == 'copy':
+            output_args['acodec'] = 'copy'
+            if plan['info'].get('audio_codec') == 'aac':
+                # ADTS (TS) -> ASC (MP4)
+                output_args['bsf:a'] = 'aac_adtstoasc'
+        elif plan['audio']:
+            output_args['acodec'] = 'aac'
+        
+        # Mapear explicitamente os streams analisados no plano
+        streams = []
+        if plan['info']:
+            if plan['video']:
+                streams.append(input_stream['v:0'])
+            if plan['audio']:
+                streams.append(input_stream['a:0'])
+        else:
+            streams.append(input_stream)
+        
+        print(f"Modo TS->MP4: {plan['mode']} (vídeo: {plan['video'] or '-'}, áudio: {plan['audio'] or '-'})")
+        return ffmpeg.output(*streams, output_path, **output_args), plan
+    
+    @_tracked_job('ts_optimized')
+    def ts_to_mp4_optimized(self, input_path: str, output_path: str,
+                            allow_ac3: bool = False, force_transcode: bool = False,
+                            progress_callback: Optional[ProgressCallback] = None,
+                            allow_extra_audio: bool = False) -> bool:
+        """Conversão otimizada específica para .ts -> .mp4 (remux quando os codecs permitem)"""
+        try:
+            output_stream, plan = self._ts_to_mp4_stream(input_path, output_path, allow_ac3, force_transcode,
+                                                         allow_extra_audio)
             
-            ffmpeg.run(output_stream, overwrite_output=True, quiet=True)
+            duration = plan['info'].get('duration')
+            if duration is None:
+                duration = self._duration_for_progress(input_path, progress_callback)
+            self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
             return True
             
         except Exception as e:
             print(f"Erro na conversão TS->MP4: {e}")
             return False
 
+    @_tracked_job('follow')
+    def follow_ts_to_fragmented_mp4(self, input_path: str, output_path: str,
+                                    idle_timeout: float = 10.0, poll_interval: float = 0.5,
+                                    stop_event: Optional[threading.Event] = None,
+                                    min_probe_bytes: int = 2 * 1024 * 1024, allow_ac3: bool = False,
+                                    progress_callback: Optional[ProgressCallback] = None,
+                                    allow_extra_audio: bool = False) -> bool:
+        """Converte um .ts que ainda está sendo gravado em MP4 fragmentado
+        
+        O arquivo é lido como um 'tail -f' e enviado ao ffmpeg pelo stdin, que
+        grava o MP4 em fragmentos à medida que os dados chegam. A leitura
+        termina quando stop_event é sinalizado (depois de enviar o que falta)
+        ou quando o arquivo passa idle_timeout segundos sem crescer.
+        """
+        try:
+            # Esperar dados suficientes para identificar os codecs
+            idle_since = time.monotonic()
+            last_size = -1
+            while True:
+                size = os.path.getsize(input_path)
+                if size >= min_probe_bytes or (stop_event and stop_event.is_set()):
+                    break
+                if size != last_size:
+                    last_size, idle_since = size, time.monotonic()
+                elif time.monotonic() - idle_since >= idle_timeout:
+                    break
+                time.sleep(poll_interval)
+            
+            plan = self.plan_ts_to_mp4(input_path, allow_ac3=allow_ac3, allow_extra_audio=allow_extra_audio)
+            output_args = {'movflags': '+frag_keyframe+empty_moov+default_base_moof'}
+            
+            if plan['video'] == 'copy':
+                output_args['vcodec'] = 'copy'
+            elif plan['video']:
+                output_args.update({'vcodec': 'libx264', 'preset': 'veryfast', 'crf': 23})
+            
+            if plan['audio'] == 'copy':
+                output_args['acodec'] = 'copy'
+                if plan['info'].get('audio_codec') == 'aac':
+                    output_args['bsf:a'] = 'aac_adtstoasc'
+            elif plan['audio']:
+                output_args['acodec'] = 'aac'
+            
+            input_stream = ffmpeg.input('pipe:0', f='mpegts')
+            streams = []
+            if plan['info']:
+                if plan['video']:
+                    streams.append(input_stream['v:0'])
+                if plan['audio']:
+                    streams.append(input_stream['a:0'])
+            else:
+                streams.append(input_stream)
+            
+            print(f"Seguindo {os.path.basename(input_path)} -> MP4 fragmentado "
+                  f"({plan['mode']}, vídeo: {plan['video'] or '-'}, áudio: {plan['audio'] or '-'})")
+            
+            def feed(stdin):
+                try:
+                    with open(input_path, 'rb') as f:
+                        idle_since = time.monotonic()
+                        while not self.cancelled:
+                            chunk = f.read(1024 * 1024)
+                            if chunk:
+                                stdin.write(chunk)
+                                idle_since = time.monotonic()
+                            elif stop_event and stop_event.is_set():
+                                break  # Gravação encerrada e tudo já foi enviado
+                            elif time.monotonic() - idle_since >= idle_timeout:
+                                break
+                            else:
+                                time.sleep(poll_interval)
+                except (BrokenPipeError, OSError, ValueError):
+                    pass  # ffmpeg saiu antes (erro ou cancelamento)
+                finally:
+                    try:
+                        stdin.close()
+                    except (BrokenPipeError, OSError):
+                        pass
+            
+            output_stream = ffmpeg.output(*streams, output_path, **output_args)
+            self._run_ffmpeg(output_stream, None, progress_callback, [output_path], stdin_feeder=feed)
+            return True
+            
+        except Exception as e:
+            print(f"Erro ao seguir o arquivo TS: {e}")
+            return False
+
 def main():
     parser = argparse.ArgumentParser(description='Conversor de Vídeo Universal')
     parser.add_argument('input', help='Arquivo ou diretório de entrada')
@@ -159,10 +1891,67 @@ def main():
     parser.add_argument('--audio-only', action='store_true', help='Converter apenas para áudio')
     parser.add_argument('--batch', action='store_true', help='Conversão em lote')
     parser.add_argument('--ts-optimized', action='store_true', help='Otimização específica para TS->MP4')
+    parser.add_argument('--allow-ac3', action='store_true',
+                       help='Copiar áudio AC-3/E-AC-3 para o MP4 sem recodificar (modo --ts-optimized)')
+    parser.add_argument('--allow-extra-audio', action='store_true',
+                       help='Copiar áudio MP2/Opus/FLAC para o MP4 sem recodificar (modo --ts-optimized; '
+                            'muitos players não tocam)')
+    parser.add_argument('--segments', type=int, default=0,
+                       help='Dividir um arquivo longo em N trechos codificados em paralelo')
+    parser.add_argument('--incremental', action='store_true',
+                       help='No modo lote, pular arquivos já convertidos (diário na pasta de saída)')
+    parser.add_argument('--watch', action='store_true',
+                       help='Observar o diretório de entrada e converter os arquivos que chegarem')
+    parser.add_argument('--follow', action='store_true',
+                       help='Seguir um .ts ainda em gravação e gerar MP4 fragmentado')
+    parser.add_argument('--idle-timeout', type=float, default=10.0,
+                       help='Segundos sem crescimento que encerram o modo --follow (padrão: 10)')
+    parser.add_argument('--recursive', action='store_true', help='No modo lote, incluir subpastas')
+    parser.add_argument('--shared', action='store_true',
+                       help='No modo lote, dividir a pasta com outras máquinas que rodem o mesmo comando '
+                            '(pastas de entrada e saída num compartilhamento de rede)')
+    parser.add_argument('--scan-workers', type=int, default=1,
+                       help='Threads para ler subpastas em paralelo (útil em compartilhamentos de rede)')
+    parser.add_argument('--speed-target', type=float,
+                       help='Escolher o preset mais lento que codifique a pelo menos N x tempo real')
+    parser.add_argument('--deadline', help='Escolher o preset para terminar até este horário (ex: 06:00)')
+    parser.add_argument('--order', choices=JobScheduler.POLICIES, default='fifo',
+                       help='Ordem do lote: fifo, longest (menor tempo total) ou shortest (resultados antes)')
+    parser.add_argument('--priority', action='append', default=[], metavar='PADRÃO',
+                       help='Passar à frente no lote os arquivos que casam com o padrão (ex: "final*.ts")')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Expor métricas no formato Prometheus em http://127.0.0.1:PORTA/metrics')
+    parser.add_argument('--thread-mode', choices=ThreadBudget.MODES,
+                       help='Planejar processos e threads do ffmpeg: latency (1 job, todos os núcleos), '
+                            'throughput (vários jobs, poucos threads) ou auto (substitui --jobs no lote)')
+    parser.add_argument('--rendition', action='append', default=[], metavar='SAÍDA[,RES][,QUALIDADE][,audio]',
+                       help='Gerar várias saídas decodificando a entrada uma vez '
+                            '(ex: --rendition a_1080.mp4,1920x1080,high --rendition a.mp3)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Número de conversões simultâneas no modo lote (padrão: 1)')
     
     args = parser.parse_args()
     
+    try:
+        renditions = [VideoConverter.parse_rendition(text) for text in args.rendition]
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.deadline:
+        try:
+            SpeedBudget.parse_deadline(args.deadline)
+        except ValueError:
+            parser.error(f"horário inválido para --deadline: {args.deadline}")
+    
     converter = VideoConverter()
+    if args.thread_mode and not args.batch:
+        # Um único arquivo: não há outros jobs disputando os núcleos
+        converter.ffmpeg_threads = ThreadBudget(mode=args.thread_mode).threads_for(1)
+    
+    if args.metrics_port:
+        from video_converter_metrics import MetricsServer
+        server = MetricsServer(converter.metrics, args.metrics_port).start()
+        print(f"Métricas em {server.address}")
     
     # Verificar FFmpeg
     if not converter.check_ffmpeg():
@@ -176,6 +1965,19 @@ def main():
         print(f"Erro: Arquivo/diretório não encontrado: {args.input}")
         sys.exit(1)
     
+    # Observação contínua de uma pasta
+    if args.watch:
+        if not input_path.is_dir():
+            print("Erro: Para o modo --watch, especifique um diretório")
+            sys.exit(1)
+        
+        from video_converter_watch import FolderWatcher
+        output_dir = args.output or f"{args.input}_converted"
+        watcher = FolderWatcher(converter, str(input_path), output_dir, args.format, args.quality,
+                                workers=args.jobs, ts_optimized=args.ts_optimized)
+        watcher.run()
+        return
+    
     # Conversão em lote
     if args.batch:
         if not input_path.is_dir():
@@ -183,7 +1985,21 @@ def main():
             sys.exit(1)
         
         output_dir = args.output or f"{args.input}_converted"
-        converted = converter.batch_convert(str(input_path), output_dir, args.format, args.quality)
+        if args.shared:
+            from video_converter_shared import SharedBatch
+            converted = SharedBatch(converter, str(input_path), output_dir, args.format, args.quality,
+                                    workers=args.jobs, recursive=args.recursive,
+                                    ts_optimized=args.ts_optimized).run()
+            print(f"\nConversão concluída! {len(converted)} arquivos convertidos neste nó.")
+            return
+        
+        converted = converter.batch_convert(str(input_path), output_dir, args.format, args.quality,
+                                            workers=args.jobs, incremental=args.incremental,
+                                            recursive=args.recursive, scan_workers=args.scan_workers,
+                                            speed_target=args.speed_target, deadline=args.deadline,
+                                            policy=args.order,
+                                            priorities={pattern: 10 for pattern in args.priority},
+                                            thread_mode=args.thread_mode)
         print(f"\nConversão concluída! {len(converted)} arquivos convertidos.")
         return
     
@@ -194,7 +2010,7 @@ def main():
             output_path = args.output
         else:
             if args.audio_only:
-                output_path = f"{input_path.stem}.{args.format if args.format in ['mp3', 'wav', 'aac'] else 'mp3'}"
+                output_path = f"{input_path.stem}.{args.format if args.format in ['mp3', 'wav', 'aac', 'm4a', 'flac', 'ogg'] else 'mp3'}"
             else:
                 output_path = f"{input_path.stem}.{args.format}"
         
@@ -207,15 +2023,37 @@ def main():
             print(f"Codec de vídeo: {info.get('video_codec', 'N/A')}")
             print(f"Codec de áudio: {info.get('audio_codec', 'N/A')}")
         
-        print(f"\nIniciando conversão para: {output_path}")
+        targets = ', '.join(rendition['output'] for rendition in renditions) or output_path
+        print(f"\nIniciando conversão para: {targets}")
         
         # Executar conversão
         success = False
         
-        if args.audio_only:
+        if renditions:
+            success = converter.convert_renditions(str(input_path), renditions)
+        elif args.follow:
+            success = converter.follow_ts_to_fragmented_mp4(str(input_path), output_path,
+                                                            idle_timeout=args.idle_timeout,
+                                                            allow_ac3=args.allow_ac3,
+                                                            allow_extra_audio=args.allow_extra_audio)
+        elif args.audio_only:
             success = converter.convert_to_audio(str(input_path), output_path)
         elif args.ts_optimized and input_path.suffix.lower() == '.ts':
-            success = converter.ts_to_mp4_optimized(str(input_path), output_path)
+            success = converter.ts_to_mp4_optimized(str(input_path), output_path, allow_ac3=args.allow_ac3,
+                                                    allow_extra_audio=args.allow_extra_audio)
+        elif args.segments > 1:
+            success = converter.convert_video_segmented(
+                str(input_path), output_path, segments=args.segments,
+                workers=args.jobs if args.jobs > 1 else None,
+                quality=args.quality, resolution=args.resolution
+            )
+        elif args.speed_target or args.deadline:
+            budget = SpeedBudget(args.speed_target, args.deadline)
+            budget.add(info.get('duration') or 0.0)
+            success = converter.convert_video_with_budget(
+                str(input_path), output_path, budget,
+                quality=args.quality, resolution=args.resolution
+            )
         else:
             success = converter.convert_video(
                 str(input_path), output_path, 
@@ -223,7 +2061,7 @@ def main():
             )
         
         if success:
-            print(f"✓ Conversão concluída com sucesso: {output_path}")
+            print(f"✓ Conversão concluída com sucesso: {targets}")
         else:
             print("✗ Falha na conversão")
             sys.exit(1)
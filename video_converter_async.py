@@ -0,0 +1,210 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+import ffmpeg
+
+from video_converter import ProbeCache, ProgressCallback, VideoConverter, _parse_progress
+
+
+class AsyncVideoConverter:
+    """Conversões e probes como corrotinas, para muitos jobs num único event loop
+    
+    Os comandos são montados pelo VideoConverter (mesmos codecs, qualidades,
+    planos de remux, cache de probe e validação de capacidades) e executados
+    com asyncio.create_subprocess_exec. Semáforos limitam quantos ffprobe e
+    quantos ffmpeg rodam ao mesmo tempo. Cancelar a task encerra o ffmpeg
+    ('q', depois terminate/kill) e apaga a saída parcial.
+    """
+    
+    def __init__(self, converter: Optional[VideoConverter] = None, max_encodes: int = 2, max_probes: int = 16):
+        self.converter = converter or VideoConverter()
+        self._encode_slots = asyncio.Semaphore(max(1, max_encodes))
+        self._probe_slots = asyncio.Semaphore(max(1, max_probes))
+    
+    async def get_video_info(self, input_path: str) -> dict:
+        """Obtém informações do vídeo (usando o cache de probe do conversor)"""
+        try:
+            key = ProbeCache.file_key(input_path)
+            info = self.converter.probe_cache.get(key)
+            if info is None:
+                async with self._probe_slots:
+                    start = time.perf_counter()
+                    process = await asyncio.create_subprocess_exec(
+                        *self.converter._probe_args(input_path),
+                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                    )
+                    try:
+                        stdout, stderr = await process.communicate()
+                    except asyncio.CancelledError:
+                        process.kill()
+                        await process.wait()
+                        raise
+                if process.returncode != 0:
+                    raise ffmpeg.Error('ffprobe', stdout, stderr)
+                info = VideoConverter._parse_probe(stdout)
+                self.converter.metrics.observe('video_converter_probe_duration_seconds',
+                                               time.perf_counter() - start)
+                # Gravação no SQLite fora do event loop
+                await asyncio.to_thread(self.converter.probe_cache.put, key, info)
+            return info
+        except Exception as e:
+            print(f"Erro ao obter informações do vídeo: {e}")
+            return {}
+    
+    async def _duration_for_progress(self, input_path: str,
+                                     progress_callback: Optional[ProgressCallback]) -> Optional[float]:
+        if progress_callback is None:
+            return None
+        return (await self.get_video_info(input_path)).get('duration')
+    
+    async def _run_ffmpeg(self, output_stream, duration: Optional[float] = None,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          output_paths: Optional[List[str]] = None):
+        """Executa o ffmpeg sem bloquear o loop; progress_callback é chamado no próprio loop"""
+        # Montar o comando pode descobrir as capacidades do ffmpeg (processos curtos)
+        args = await asyncio.to_thread(self.converter._compile_ffmpeg, output_stream, output_paths)
+        
+        async with self._encode_slots:
+            process = await asyncio.create_subprocess_exec(
+                *args, stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            stderr_tail = deque(maxlen=50)
+            
+            async def drain_stderr():
+                async for line in process.stderr:
+                    stderr_tail.append(line)
+            
+            drain = asyncio.ensure_future(drain_stderr())
+            try:
+                fields = {}
+                async for raw_line in process.stdout:
+                    key, _, value = raw_line.decode('utf-8', 'replace').strip().partition('=')
+                    if not key:
+                        continue
+                    fields[key] = value
+                    if key == 'progress':
+                        if progress_callback:
+                            progress_callback(_parse_progress(fields, duration))
+                        fields = {}
+                returncode = await process.wait()
+                await drain
+            except asyncio.CancelledError:
+                drain.cancel()
+                await self._stop(process)
+                # Saída parcial não serve para nada
+                for path in output_paths or []:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                raise
+        
+        if returncode != 0:
+            raise ffmpeg.Error('ffmpeg', None, b''.join(stderr_tail))
+    
+    @staticmethod
+    async def _stop(process, timeout: float = 0.5):
+        """Encerra o ffmpeg: 'q' primeiro, depois terminate e kill"""
+        try:
+            process.stdin.write(b'q')
+            await process.stdin.drain()
+        except (OSError, ValueError, ConnectionError):
+            pass
+        for stop in (None, process.terminate, process.kill):
+            if stop:
+                try:
+                    stop()
+                except ProcessLookupError:
+                    break
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+                break
+            except asyncio.TimeoutError:
+                continue
+    
+    async def convert_video(self, input_path: str, output_path: str,
+                            video_codec: str = 'libx264', audio_codec: str = 'aac',
+                            quality: str = 'medium', resolution: Optional[str] = None,
+                            progress_callback: Optional[ProgressCallback] = None,
+                            preset: Optional[str] = None, comment: Optional[str] = None) -> bool:
+        """Versão assíncrona de VideoConverter.convert_video"""
+        try:
+            output_stream = self.converter._convert_video_stream(input_path, output_path, video_codec, audio_codec,
+                                                                 quality, resolution, preset, comment)
+            duration = await self._duration_for_progress(input_path, progress_callback)
+            await self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
+            return True
+        except Exception as e:
+            print(f"Erro na conversão: {e}")
+            return False
+    
+    async def convert_to_audio(self, input_path: str, output_path: str,
+                               audio_codec: Optional[str] = None, bitrate: str = '192k',
+                               allow_copy: bool = True,
+                               progress_callback: Optional[ProgressCallback] = None) -> bool:
+        """Versão assíncrona de VideoConverter.convert_to_audio"""
+        try:
+            # O probe assíncrono preenche o cache usado pelo plano de áudio
+            await self.get_video_info(input_path)
+            output_stream, plan = await asyncio.to_thread(self.converter._audio_stream, input_path, output_path,
+                                                          audio_codec, bitrate, allow_copy)
+            duration = await self._duration_for_progress(input_path, progress_callback)
+            await self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
+            print(self.converter._audio_done_message(plan, output_path))
+            return True
+        except Exception as e:
+            print(f"Erro na conversão para áudio: {e}")
+            return False
+    
+    async def ts_to_mp4_optimized(self, input_path: str, output_path: str,
+                                  allow_ac3: bool = False, force_transcode: bool = False,
+                                  progress_callback: Optional[ProgressCallback] = None,
+                                  allow_extra_audio: bool = False) -> bool:
+        """Versão assíncrona de VideoConverter.ts_to_mp4_optimized"""
+        try:
+            if not force_transcode:
+                await self.get_video_info(input_path)
+            output_stream, plan = await asyncio.to_thread(self.converter._ts_to_mp4_stream, input_path,
+                                                          output_path, allow_ac3, force_transcode,
+                                                          allow_extra_audio)
+            duration = plan['info'].get('duration')
+            if duration is None:
+                duration = await self._duration_for_progress(input_path, progress_callback)
+            await self._run_ffmpeg(output_stream, duration, progress_callback, [output_path])
+            return True
+        except Exception as e:
+            print(f"Erro na conversão TS->MP4: {e}")
+            return False
+    
+    async def progress(self, conversion: str, *args, **kwargs) -> AsyncIterator[dict]:
+        """Executa uma conversão e produz seus eventos de progresso
+        
+        async for event in conversor.progress('convert_video', 'a.ts', 'a.mp4'): ...
+        
+        O último evento traz 'result' (True/False). Sair do laço antes do
+        fim cancela a conversão; com contextlib.aclosing() o ffmpeg é
+        encerrado na hora, e não só quando o gerador for coletado.
+        """
+        events = asyncio.Queue()
+        task = asyncio.ensure_future(
+            getattr(self, conversion)(*args, progress_callback=events.put_nowait, **kwargs)
+        )
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            yield {'done': True, 'result': task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
@@ -0,0 +1,246 @@
+import os
+import tkinter as tk
+from array import array
+from pathlib import Path
+from tkinter import ttk
+from typing import Dict, Iterable, List, Optional
+
+
+class BatchFileStore:
+    """Dados da lista de lote em arrays compactos, só acrescentados
+    
+    O id de cada linha é a sua posição nos arrays de dados, então
+    atualizações de probe e de status são O(1). A ordem de exibição fica
+    num array de índices à parte: ordenar ou remover só reescreve esse
+    array. Linhas removidas continuam nos arrays de dados até clear().
+    Duração -1 significa "ainda sem probe".
+    """
+    
+    STATUS_LABELS = ['Aguardando', 'Convertendo', 'Concluído', 'Falha', 'Cancelado']
+    WAITING, CONVERTING, DONE, FAILED, CANCELLED = range(5)
+    
+    def __init__(self):
+        self._base = 0
+        self.paths: List[str] = []
+        self.clear()
+    
+    def clear(self):
+        # Ids não são reaproveitados: probes atrasados de linhas apagadas não acertam linhas novas
+        self._base += len(self.paths)
+        self.order = array('q')
+        self.sizes = array('q')
+        self.durations = array('d')
+        self.widths = array('i')
+        self.heights = array('i')
+        self.status = array('b')
+        self.removed = bytearray()
+        self.paths = []
+        self.codecs: List[Optional[str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.order)
+    
+    def _slot(self, row_id: int) -> Optional[int]:
+        slot = row_id - self._base
+        if 0 <= slot < len(self.paths) and not self.removed[slot]:
+            return slot
+        return None
+    
+    def extend(self, paths: List[str], sizes: Iterable[int]) -> range:
+        """Acrescenta vários arquivos de uma vez e devolve os ids criados"""
+        count = len(paths)
+        start = len(self.paths)
+        
+        self.order.extend(range(start, start + count))
+        self.sizes.extend(sizes)
+        self.durations.extend(array('d', [-1.0]) * count)
+        self.widths.extend(array('i', [0]) * count)
+        self.heights.extend(array('i', [0]) * count)
+        self.status.extend(array('b', [self.WAITING]) * count)
+        self.removed.extend(bytes(count))
+        self.paths.extend(paths)
+        self.codecs.extend([None] * count)
+        return range(self._base + start, self._base + start + count)
+    
+    def id_at(self, position: int) -> int:
+        """Id da linha exibida nesta posição"""
+        return self._base + self.order[position]
+    
+    def ids_between(self, start: int, stop: int) -> List[int]:
+        return [self._base + slot for slot in self.order[start:stop]]
+    
+    def path(self, row_id: int) -> Optional[str]:
+        slot = self._slot(row_id)
+        return None if slot is None else self.paths[slot]
+    
+    def set_probe(self, row_id: int, info: dict) -> Optional[int]:
+        """Guarda o resultado do probe; devolve o id (None se a linha sumiu)"""
+        slot = self._slot(row_id)
+        if slot is None:
+            return None
+        info = info or {}
+        self.durations[slot] = info.get('duration') or 0.0
+        self.widths[slot] = info.get('width') or 0
+        self.heights[slot] = info.get('height') or 0
+        if info:
+            codecs = [codec for codec in (info.get('video_codec'), info.get('audio_codec')) if codec]
+            self.codecs[slot] = " / ".join(codecs) or "—"
+        else:
+            self.codecs[slot] = "erro"
+        return row_id
+    
+    def set_status(self, row_id: int, status: int) -> Optional[int]:
+        slot = self._slot(row_id)
+        if slot is None:
+            return None
+        self.status[slot] = status
+        return row_id
+    
+    def remove(self, row_ids: Iterable[int]):
+        """Remove vários arquivos de uma vez (uma única passada pela ordem de exibição)"""
+        for row_id in row_ids:
+            slot = self._slot(row_id)
+            if slot is not None:
+                self.removed[slot] = 1
+        removed = self.removed
+        self.order = array('q', [slot for slot in self.order if not removed[slot]])
+    
+    def sort(self, column: str, reverse: bool = False):
+        """Ordena a exibição por 'size', 'duration' ou 'status'"""
+        values = {'size': self.sizes, 'duration': self.durations, 'status': self.status}[column]
+        order = sorted(self.order, key=values.__getitem__, reverse=reverse)
+        if column == 'duration' and not reverse:
+            # Linhas sem probe (-1) vão para o fim também na ordem crescente
+            unknown = sum(1 for slot in order if values[slot] < 0)
+            order = order[unknown:] + order[:unknown]
+        self.order = array('q', order)
+    
+    def row_values(self, position: int) -> tuple:
+        """Valores exibidos na linha desta posição"""
+        slot = self.order[position]
+        path = self.paths[slot]
+        duration = self.durations[slot]
+        if duration < 0:
+            duration_text = resolution = "…"
+        else:
+            minutes, seconds = divmod(int(duration), 60)
+            duration_text = f"{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}"
+            width, height = self.widths[slot], self.heights[slot]
+            resolution = f"{width}x{height}" if width else "—"
+        return (
+            os.path.basename(path),
+            Path(path).suffix[1:].upper(),
+            f"{self.sizes[slot] / (1024 * 1024):.1f} MB",
+            duration_text,
+            resolution,
+            self.codecs[slot] or "…",
+            self.STATUS_LABELS[self.status[slot]]
+        )
+
+
+class VirtualFileList(ttk.Frame):
+    """Lista de lote virtualizada: só as linhas visíveis existem no Treeview
+    
+    O Treeview tem um número fixo de linhas que são reaproveitadas ao rolar;
+    a barra de rolagem e a roda do mouse mudam apenas o deslocamento na
+    BatchFileStore.
+    """
+    
+    def __init__(self, parent, store: BatchFileStore, columns: Dict[str, tuple],
+                 visible_rows: int = 15, on_view_change=None):
+        super().__init__(parent)
+        self.store = store
+        self.visible_rows = visible_rows
+        self.on_view_change = on_view_change
+        self.offset = 0
+        self.selected_ids = set()
+        self._rendering = False
+        self._additive_click = False
+        
+        self.tree = ttk.Treeview(self, columns=tuple(columns), show='headings', height=visible_rows)
+        for name, (title, width, command) in columns.items():
+            self.tree.heading(name, text=title, command=command or '')
+            self.tree.column(name, width=width)
+        for index in range(visible_rows):
+            self.tree.insert('', 'end', iid=f'row{index}', values=())
+        
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        self.tree.bind('<ButtonPress-1>', self.on_click, add='+')
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_by(3))
+    
+    def visible_ids(self) -> List[int]:
+        return self.store.ids_between(self.offset, self.offset + self.visible_rows)
+    
+    def render(self):
+        """Redesenha a janela visível a partir da store"""
+        total = len(self.store)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        self._rendering = True
+        selection = []
+        for index in range(self.visible_rows):
+            position = self.offset + index
+            iid = f'row{index}'
+            if position < total:
+                self.tree.item(iid, values=self.store.row_values(position))
+                if self.store.id_at(position) in self.selected_ids:
+                    selection.append(iid)
+            else:
+                self.tree.item(iid, values=())
+        self.tree.selection_set(selection)
+        # O <<TreeviewSelect>> gerado por selection_set chega depois, pela fila de eventos
+        self.after_idle(self._end_render)
+        
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self.on_view_change:
+            self.on_view_change(self.visible_ids())
+    
+    def _end_render(self):
+        self._rendering = False
+    
+    def refresh_row(self, row_id: Optional[int]):
+        """Atualiza uma única linha, se estiver visível"""
+        if row_id is None:
+            return
+        for index, visible_id in enumerate(self.visible_ids()):
+            if visible_id == row_id:
+                self.tree.item(f'row{index}', values=self.store.row_values(self.offset + index))
+                return
+    
+    def scroll_by(self, rows: int):
+        self.offset += rows
+        self.render()
+        return 'break'
+    
+    def on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.store))
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self.offset += int(value) * step
+        self.render()
+    
+    def on_click(self, event):
+        # Ctrl/Shift preservam a seleção fora da tela
+        self._additive_click = bool(event.state & 0x0005)
+    
+    def on_select(self, event=None):
+        if self._rendering:
+            return
+        visible = set(self.visible_ids())
+        chosen = {self.store.id_at(self.offset + int(iid[3:])) for iid in self.tree.selection()
+                  if self.offset + int(iid[3:]) < len(self.store)}
+        if self._additive_click:
+            self.selected_ids = (self.selected_ids - visible) | chosen
+        else:
+            self.selected_ids = chosen
@@ -1,21 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import tkinter.font as tkFont
-from tkinterdnd2 import DND_FILES, TkinterDnD
 import threading
 import os
 import sys
 from pathlib import Path
+import io
 import json
 from datetime import datetime
 import subprocess
-from PIL import Image, ImageTk
-import cv2
-from video_converter import VideoConverter
+from collections import deque
+from video_converter import VideoConverter, scan_media_files
+from video_converter_batch_list import BatchFileStore, VirtualFileList
+from video_converter_probe import ProbePool
+from video_converter_thumbnails import ThumbnailService
 
 class VideoConverterGUI:
     def __init__(self):
-        self.root = TkinterDnD.Tk()
+        # Janela comum: tkinterdnd2 e PIL só são carregados quando usados
+        self.root = tk.Tk()
         self.root.title("Conversor de Vídeo Universal - v2.0")
         self.root.geometry("1200x800")
         self.root.minsize(1000, 700)
@@ -25,6 +28,14 @@ class VideoConverterGUI:
         
         # Variáveis
         self.converter = VideoConverter()
+        self.thumbnails = ThumbnailService(self.converter)
+        self.probe_pool = ProbePool(self.converter)
+        self.batch_store = BatchFileStore()
+        self.batch_sort_reverse = False
+        self.probe_results = deque()
+        self.probe_flush_scheduled = False
+        self.probe_flush_lock = threading.Lock()
+        self.preview_path = None
         self.input_files = []
         self.output_directory = tk.StringVar()
         self.current_conversion = None
@@ -52,7 +63,7 @@ class VideoConverterGUI:
         # Configurar drag and drop
         self.setup_drag_drop()
         
-        # Verificar FFmpeg
+        # Verificar FFmpeg em segundo plano
         self.check_ffmpeg_on_startup()
     
     def setup_styles(self):
@@ -178,14 +189,14 @@ class VideoConverterGUI:
         
         # Segunda linha
         ttk.Label(settings_frame, text="Codec Vídeo:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(10, 0))
-        video_codec_combo = ttk.Combobox(settings_frame, textvariable=self.settings['video_codec'],
-                                        values=['libx264', 'libx265', 'libvpx', 'libvpx-vp9'], width=10)
-        video_codec_combo.grid(row=1, column=1, padx=5, pady=(10, 0))
+        self.video_codec_combo = ttk.Combobox(settings_frame, textvariable=self.settings['video_codec'],
+                                             values=['libx264', 'libx265', 'libvpx', 'libvpx-vp9'], width=10)
+        self.video_codec_combo.grid(row=1, column=1, padx=5, pady=(10, 0))
         
         ttk.Label(settings_frame, text="Codec Áudio:").grid(row=1, column=2, sticky=tk.W, padx=(10, 5), pady=(10, 0))
-        audio_codec_combo = ttk.Combobox(settings_frame, textvariable=self.settings['audio_codec'],
-                                        values=['aac', 'mp3', 'libvorbis', 'flac'], width=10)
-        audio_codec_combo.grid(row=1, column=3, padx=5, pady=(10, 0))
+        self.audio_codec_combo = ttk.Combobox(settings_frame, textvariable=self.settings['audio_codec'],
+                                             values=['aac', 'mp3', 'libvorbis', 'flac'], width=10)
+        self.audio_codec_combo.grid(row=1, column=3, padx=5, pady=(10, 0))
         
         ttk.Label(settings_frame, text="Bitrate Áudio:").grid(row=1, column=4, sticky=tk.W, padx=(10, 5), pady=(10, 0))
         audio_bitrate_combo = ttk.Combobox(settings_frame, textvariable=self.settings['audio_bitrate'],
@@ -226,27 +237,19 @@ class VideoConverterGUI:
         tab_frame.columnconfigure(0, weight=1)
         tab_frame.rowconfigure(0, weight=1)
         
-        # Treeview para lista de arquivos
-        columns = ('arquivo', 'formato', 'tamanho', 'status')
-        self.files_tree = ttk.Treeview(files_frame, columns=columns, show='headings', height=15)
-        
-        # Configurar colunas
-        self.files_tree.heading('arquivo', text='Arquivo')
-        self.files_tree.heading('formato', text='Formato')
-        self.files_tree.heading('tamanho', text='Tamanho')
-        self.files_tree.heading('status', text='Status')
-        
-        self.files_tree.column('arquivo', width=300)
-        self.files_tree.column('formato', width=80)
-        self.files_tree.column('tamanho', width=100)
-        self.files_tree.column('status', width=120)
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(files_frame, orient=tk.VERTICAL, command=self.files_tree.yview)
-        self.files_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.files_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # Lista virtualizada: só as linhas visíveis existem no Treeview
+        columns = {
+            'arquivo': ('Arquivo', 300, None),
+            'formato': ('Formato', 80, None),
+            'tamanho': ('Tamanho', 100, lambda: self.sort_batch_files('size')),
+            'duracao': ('Duração', 90, lambda: self.sort_batch_files('duration')),
+            'resolucao': ('Resolução', 100, None),
+            'codecs': ('Codecs', 120, None),
+            'status': ('Status', 120, lambda: self.sort_batch_files('status'))
+        }
+        self.files_list = VirtualFileList(files_frame, self.batch_store, columns, visible_rows=15,
+                                          on_view_change=self.probe_pool.prioritize)
+        self.files_list.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         files_frame.columnconfigure(0, weight=1)
         files_frame.rowconfigure(0, weight=1)
         
@@ -360,11 +363,22 @@ class VideoConverterGUI:
     
     def setup_drag_drop(self):
         """Configurar drag and drop"""
-        self.drop_area.drop_target_register(DND_FILES)
-        self.drop_area.dnd_bind('<<Drop>>', self.on_drop)
-        
         # Tornar a área clicável
         self.drop_area.bind('<Button-1>', lambda e: self.select_input_file())
+        
+        # A extensão tkdnd é carregada depois que a janela aparece
+        self.root.after(100, self.enable_drag_drop)
+    
+    def enable_drag_drop(self):
+        """Carregar tkinterdnd2 na janela já criada e registrar a área de drop"""
+        try:
+            from tkinterdnd2 import DND_FILES, TkinterDnD
+            TkinterDnD._require(self.root)
+        except (ImportError, RuntimeError, tk.TclError) as e:
+            print(f"Arrastar e soltar indisponível: {e}")
+            return
+        self.drop_area.drop_target_register(DND_FILES)
+        self.drop_area.dnd_bind('<<Drop>>', self.on_drop)
     
     def on_drop(self, event):
         """Manipular arquivos arrastados"""
@@ -374,6 +388,45 @@ class VideoConverterGUI:
             if self.input_files:
                 self.update_file_info(self.input_files[0])
                 self.update_preview(self.input_files[0])
+            
+            # Pastas arrastadas são varridas fora da thread da interface
+            folders = [f for f in files if os.path.isdir(f)]
+            if folders:
+                self.scan_folders_in_background(folders, self.on_dropped_folder_files)
+    
+    def on_dropped_folder_files(self, entries):
+        """Recebe os vídeos encontrados nas pastas arrastadas"""
+        first_file = not self.input_files
+        self.input_files.extend(entry.path for entry in entries)
+        if first_file and self.input_files:
+            self.update_file_info(self.input_files[0])
+            self.update_preview(self.input_files[0])
+    
+    def scan_folders_in_background(self, folders, on_chunk, chunk_size=200):
+        """Varre pastas recursivamente em uma thread, entregando os arquivos em blocos
+        
+        Cada bloco é entregue na thread da interface via root.after, então as
+        primeiras linhas aparecem enquanto a varredura ainda está em andamento.
+        """
+        extensions = self.converter.supported_video_formats
+        
+        def scan():
+            found = 0
+            chunk = []
+            for folder in folders:
+                for entry in scan_media_files(folder, extensions, workers=4):
+                    chunk.append(entry)
+                    if len(chunk) >= chunk_size:
+                        found += len(chunk)
+                        self.root.after(0, on_chunk, chunk)
+                        self.root.after(0, self.update_status, f"Varrendo... {found} vídeo(s) encontrado(s)")
+                        chunk = []
+            found += len(chunk)
+            if chunk:
+                self.root.after(0, on_chunk, chunk)
+            self.root.after(0, self.update_status, f"Varredura concluída: {found} vídeo(s)")
+        
+        threading.Thread(target=scan, daemon=True).start()
     
     def select_input_file(self):
         """Selecionar arquivo de entrada"""
@@ -419,37 +472,35 @@ class VideoConverterGUI:
             self.file_info_text.config(state='disabled')
     
     def update_preview(self, file_path):
-        """Atualizar preview do vídeo"""
+        """Atualizar preview do vídeo (a miniatura é gerada em segundo plano)"""
+        self.preview_path = file_path
+        
+        data = self.thumbnails.get_cached(file_path)
+        if data is not None:
+            self.show_preview(file_path, data)
+            return
+        
+        self.preview_label.config(image="", text="Carregando preview...")
+        self.preview_label.image = None
+        self.thumbnails.request(
+            file_path, lambda path, data: self.root.after(0, self.show_preview, path, data)
+        )
+    
+    def show_preview(self, file_path, data):
+        """Exibir a miniatura (ignora respostas de arquivos que já não estão selecionados)"""
+        if file_path != self.preview_path:
+            return
+        
+        if not data:
+            self.preview_label.config(image="", text="Preview não disponível")
+            self.preview_label.image = None
+            return
+        
         try:
-            # Capturar frame do vídeo
-            cap = cv2.VideoCapture(file_path)
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret:
-                # Redimensionar frame
-                height, width = frame.shape[:2]
-                max_size = 200
-                
-                if width > height:
-                    new_width = max_size
-                    new_height = int(height * max_size / width)
-                else:
-                    new_height = max_size
-                    new_width = int(width * max_size / height)
-                
-                frame = cv2.resize(frame, (new_width, new_height))
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Converter para PhotoImage
-                image = Image.fromarray(frame)
-                photo = ImageTk.PhotoImage(image)
-                
-                self.preview_label.config(image=photo, text="")
-                self.preview_label.image = photo  # Manter referência
-            else:
-                self.preview_label.config(image="", text="Preview não disponível")
-                
+            from PIL import Image, ImageTk  # Carregado no primeiro preview
+            photo = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+            self.preview_label.config(image=photo, text="")
+            self.preview_label.image = photo  # Manter referência
         except Exception as e:
             self.preview_label.config(image="", text=f"Erro no preview: {str(e)[:30]}...")
     
@@ -459,6 +510,7 @@ class VideoConverterGUI:
         self.file_info_text.config(state='normal')
         self.file_info_text.delete(1.0, tk.END)
         self.file_info_text.config(state='disabled')
+        self.preview_path = None
         self.preview_label.config(image="", text="Nenhum arquivo selecionado")
         self.preview_label.image = None
     
@@ -479,8 +531,21 @@ class VideoConverterGUI:
             input_dir = os.path.dirname(self.input_files[0])
             self.output_directory.set(input_dir)
         
+        # Validar codecs e formato contra o FFmpeg instalado antes de começar
+        output_name = f"saida.{self.settings['output_format'].get()}"
+        if self.settings['audio_only'].get():
+            problems = self.converter.capabilities.problems(output_name)
+        else:
+            problems = self.converter.capabilities.problems(
+                output_name, [self.settings['video_codec'].get(), self.settings['audio_codec'].get()]
+            )
+        if problems:
+            messagebox.showerror("FFmpeg sem suporte", "\n".join(problems))
+            return
+        
         # Iniciar conversão em thread separada
         self.is_converting = True
+        self.converter.reset_cancel()
         thread = threading.Thread(target=self._convert_file, args=(self.input_files[0],))
         thread.daemon = True
         thread.start()
@@ -515,6 +580,8 @@ class VideoConverterGUI:
             if success:
                 self.root.after(0, lambda: self.update_status("Conversão concluída!", 100))
                 self.root.after(0, lambda: messagebox.showinfo("Sucesso", f"Arquivo convertido: {output_file}"))
+            elif self.converter.cancelled:
+                self.root.after(0, lambda: self.update_status("Conversão cancelada", 0))
             else:
                 self.root.after(0, lambda: self.update_status("Erro na conversão", 0))
                 self.root.after(0, lambda: messagebox.showerror("Erro", "Falha na conversão"))
@@ -529,9 +596,10 @@ class VideoConverterGUI:
     def stop_conversion(self):
         """Parar conversão"""
         if self.is_converting:
-            # Implementar lógica para parar conversão
             self.is_converting = False
-            self.update_status("Conversão cancelada", 0)
+            self.update_status("Cancelando conversão...", 0)
+            # Encerrar o ffmpeg atual fora da thread da interface
+            threading.Thread(target=self.converter.cancel, daemon=True).start()
     
     def update_status(self, message, progress=None):
         """Atualizar status e progresso"""
@@ -556,47 +624,92 @@ class VideoConverterGUI:
             ]
         )
         
-        for file_path in files:
-            self.add_file_to_batch(file_path)
+        self.add_files_to_batch(list(files))
     
     def add_batch_folder(self):
         """Adicionar pasta para conversão em lote"""
         folder = filedialog.askdirectory(title="Selecionar pasta com vídeos")
         if folder:
-            for file_path in Path(folder).rglob('*'):
-                if file_path.is_file() and file_path.suffix.lower() in ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.ts', '.m2ts']:
-                    self.add_file_to_batch(str(file_path))
-    
-    def add_file_to_batch(self, file_path):
+            self.scan_folders_in_background([folder], self.add_entries_to_batch)
+    
+    def add_entries_to_batch(self, entries):
+        """Adicionar à lista de lote um bloco de arquivos vindos da varredura"""
+        paths, sizes = [], []
+        for entry in entries:
+            try:
+                # O stat do DirEntry já foi feito pela varredura
+                sizes.append(entry.stat().st_size)
+                paths.append(entry.path)
+            except OSError as e:
+                print(f"Erro ao adicionar arquivo {entry.path}: {e}")
+        self.add_files_to_batch(paths, sizes)
+    
+    def add_file_to_batch(self, file_path, file_size=None):
         """Adicionar arquivo à lista de lote"""
-        try:
-            file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
-            file_format = Path(file_path).suffix[1:].upper()
-            
-            self.files_tree.insert('', 'end', values=(
-                os.path.basename(file_path),
-                file_format,
-                f"{file_size:.1f} MB",
-                "Aguardando"
-            ))
-        except Exception as e:
-            print(f"Erro ao adicionar arquivo {file_path}: {e}")
+        self.add_files_to_batch([file_path], None if file_size is None else [file_size])
+    
+    def add_files_to_batch(self, paths, sizes=None):
+        """Adicionar vários arquivos de uma vez (duração e codecs chegam depois, via probe)"""
+        if sizes is None:
+            sizes = []
+            for file_path in list(paths):
+                try:
+                    sizes.append(os.path.getsize(file_path))
+                except OSError as e:
+                    print(f"Erro ao adicionar arquivo {file_path}: {e}")
+                    paths.remove(file_path)
+        
+        row_ids = self.batch_store.extend(paths, sizes)
+        for row_id, file_path in zip(row_ids, paths):
+            self.probe_pool.submit(row_id, file_path, self.on_batch_probe)
+        self.files_list.render()
+    
+    def on_batch_probe(self, row_id, info):
+        """Chamado pelos workers de probe; acumula e repassa em blocos para a interface"""
+        self.probe_results.append((row_id, info))
+        with self.probe_flush_lock:
+            if self.probe_flush_scheduled:
+                return
+            self.probe_flush_scheduled = True
+        self.root.after(50, self.flush_probe_results)
+    
+    def flush_probe_results(self):
+        """Aplicar na lista os probes concluídos desde a última rodada"""
+        with self.probe_flush_lock:
+            self.probe_flush_scheduled = False
+        while self.probe_results:
+            row_id, info = self.probe_results.popleft()
+            # Linhas removidas enquanto o probe rodava são ignoradas pela store
+            self.files_list.refresh_row(self.batch_store.set_probe(row_id, info))
+    
+    def set_batch_status(self, row_id, status):
+        """Atualizar o status de uma linha (BatchFileStore.WAITING, CONVERTING, ...)"""
+        self.files_list.refresh_row(self.batch_store.set_status(row_id, status))
+    
+    def sort_batch_files(self, column):
+        """Ordenar a lista de lote por tamanho, duração ou status"""
+        self.batch_store.sort(column, reverse=self.batch_sort_reverse)
+        self.batch_sort_reverse = not self.batch_sort_reverse
+        self.files_list.render()
     
     def remove_selected_files(self):
         """Remover arquivos selecionados da lista"""
-        selected_items = self.files_tree.selection()
-        for item in selected_items:
-            self.files_tree.delete(item)
+        selected_ids = self.files_list.selected_ids
+        self.probe_pool.cancel(selected_ids)
+        self.batch_store.remove(selected_ids)
+        self.files_list.selected_ids = set()
+        self.files_list.render()
     
     def clear_batch_files(self):
         """Limpar todos os arquivos da lista"""
-        for item in self.files_tree.get_children():
-            self.files_tree.delete(item)
+        self.probe_pool.clear()
+        self.batch_store.clear()
+        self.files_list.selected_ids = set()
+        self.files_list.render()
     
     def start_batch_conversion(self):
         """Iniciar conversão em lote"""
-        items = self.files_tree.get_children()
-        if not items:
+        if not len(self.batch_store):
             messagebox.showwarning("Aviso", "Adicione arquivos para conversão em lote")
             return
         
@@ -608,16 +721,32 @@ class VideoConverterGUI:
         messagebox.showinfo("Info", "Conversão em lote iniciada!")
     
     def check_ffmpeg_on_startup(self):
-        """Verificar FFmpeg na inicialização"""
-        if not self.converter.check_ffmpeg():
-            messagebox.showerror(
-                "FFmpeg não encontrado",
-                "FFmpeg não foi encontrado no sistema.\n\n"
-                "Para usar este programa, você precisa instalar o FFmpeg:\n"
-                "1. Baixe de: https://ffmpeg.org/download.html\n"
-                "2. Ou use: winget install FFmpeg\n"
-                "3. Ou use: choco install ffmpeg"
-            )
+        """Verificar FFmpeg numa thread, sem atrasar a abertura da janela"""
+        def check():
+            if self.converter.check_ffmpeg():
+                self.root.after(0, self.apply_ffmpeg_capabilities)
+            else:
+                self.root.after(0, self.show_ffmpeg_missing)
+        
+        threading.Thread(target=check, daemon=True, name='ffmpeg-check').start()
+    
+    def apply_ffmpeg_capabilities(self):
+        """Deixar nos combos só os encoders que o FFmpeg instalado tem"""
+        capabilities = self.converter.capabilities.load()
+        if not capabilities or not capabilities['encoders']:
+            return
+        for combo in (self.video_codec_combo, self.audio_codec_combo):
+            combo['values'] = [codec for codec in combo['values'] if codec in capabilities['encoders']]
+    
+    def show_ffmpeg_missing(self):
+        messagebox.showerror(
+            "FFmpeg não encontrado",
+            "FFmpeg não foi encontrado no sistema.\n\n"
+            "Para usar este programa, você precisa instalar o FFmpeg:\n"
+            "1. Baixe de: https://ffmpeg.org/download.html\n"
+            "2. Ou use: winget install FFmpeg\n"
+            "3. Ou use: choco install ffmpeg"
+        )
     
     def save_settings(self):
         """Salvar configurações"""
@@ -6,29 +6,13 @@ import sys
 from pathlib import Path
 import json
 from datetime import datetime
-import subprocess
 import traceback
+import importlib.util
 
-# Importações condicionais
-try:
-    import cv2
-    OPENCV_AVAILABLE = True
-except ImportError:
-    OPENCV_AVAILABLE = False
+# tkinterdnd2 só é localizado aqui; a importação fica para setup_drag_drop
+DND_AVAILABLE = importlib.util.find_spec('tkinterdnd2') is not None
 
-try:
-    from tkinterdnd2 import DND_FILES, TkinterDnD
-    DND_AVAILABLE = True
-except ImportError:
-    DND_AVAILABLE = False
-
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
-
-from video_converter import VideoConverter
+from video_converter import JobScheduler, VideoConverter, scan_media_files
 
 class VideoConverterGUI:
     def __init__(self, debug_mode=False):
@@ -37,23 +21,9 @@ class VideoConverterGUI:
         if self.debug_mode:
             print("🚀 [DEBUG] Iniciando VideoConverterGUI...")
         
-        # Inicializar tkinter padrão primeiro
+        # Janela tkinter padrão; a extensão tkdnd é carregada nela depois que a janela aparecer
         self.root = tk.Tk()
-        self.dnd_enabled = False
-        
-        # Tentar atualizar para TkinterDnD se disponível
-        if DND_AVAILABLE:
-            try:
-                self.root.destroy()
-                self.root = TkinterDnD.Tk()
-                self.dnd_enabled = True
-                if self.debug_mode:
-                    print("✅ [DEBUG] TkinterDnD inicializado com sucesso")
-            except Exception as e:
-                if self.debug_mode:
-                    print(f"❌ [DEBUG] Erro ao inicializar TkinterDnD: {e}")
-                self.root = tk.Tk()
-                self.dnd_enabled = False
+        self.dnd_enabled = DND_AVAILABLE
         
         self.root.title("Conversor de Vídeo Universal v4.0")
         self.root.geometry("900x600")
@@ -77,18 +47,19 @@ class VideoConverterGUI:
             'output_format': tk.StringVar(master=self.root, value='mp4'),
             'quality': tk.StringVar(master=self.root, value='medium'),
             'audio_only': tk.BooleanVar(master=self.root, value=False),
-            'overwrite': tk.BooleanVar(master=self.root, value=True)
+            'overwrite': tk.BooleanVar(master=self.root, value=True),
+            'job_order': tk.StringVar(master=self.root, value='fifo')
         }
         
         # Criar interface
         self.create_widgets()
         self.load_settings()
         
-        # Configurar drag-drop se habilitado
+        # Configurar drag-drop se habilitado (após a primeira pintura)
         if self.dnd_enabled and hasattr(self, 'drop_area'):
-            self.setup_drag_drop()
+            self.root.after(100, self.setup_drag_drop)
         
-        # Verificar FFmpeg
+        # Verificar FFmpeg em segundo plano
         self.check_ffmpeg_on_startup()
         
         if self.debug_mode:
@@ -190,11 +161,17 @@ class VideoConverterGUI:
                                    values=['low', 'medium', 'high', 'ultra'], state="readonly")
         quality_combo.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=(0, 5), padx=(5, 0))
         
+        # Ordem do lote
+        ttk.Label(settings_frame, text="Ordem:").grid(row=2, column=0, sticky=tk.W, pady=(0, 5))
+        order_combo = ttk.Combobox(settings_frame, textvariable=self.settings['job_order'],
+                                   values=JobScheduler.POLICIES, state="readonly")
+        order_combo.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=(0, 5), padx=(5, 0))
+        
         # Opções
         ttk.Checkbutton(settings_frame, text="Apenas áudio", 
-                       variable=self.settings['audio_only']).grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+                       variable=self.settings['audio_only']).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
         ttk.Checkbutton(settings_frame, text="Sobrescrever arquivos", 
-                       variable=self.settings['overwrite']).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+                       variable=self.settings['overwrite']).grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
         
         settings_frame.columnconfigure(1, weight=1)
     
@@ -253,22 +230,27 @@ class VideoConverterGUI:
     def setup_drag_drop(self):
         """Configurar funcionalidade de drag and drop"""
         try:
+            from tkinterdnd2 import DND_FILES, TkinterDnD
+            TkinterDnD._require(self.root)
             self.drop_area.drop_target_register(DND_FILES)
             self.drop_area.dnd_bind('<<Drop>>', self.on_drop)
             self.debug_print("✅ [DEBUG] Drag-drop configurado com sucesso")
         except Exception as e:
+            self.dnd_enabled = False
             self.debug_print(f"❌ [DEBUG] Erro ao configurar drag-drop: {e}")
     
     def on_drop(self, event):
         """Manipular arquivos arrastados"""
         try:
             files = self.root.tk.splitlist(event.data)
-            for file_path in files:
-                if os.path.isfile(file_path) and self.is_video_file(file_path):
-                    if file_path not in self.input_files:
-                        self.input_files.append(file_path)
-                        self.file_listbox.insert(tk.END, os.path.basename(file_path))
-            self.update_status(f"Adicionados {len(files)} arquivo(s)")
+            folders = [path for path in files if os.path.isdir(path)]
+            files = [path for path in files if os.path.isfile(path) and self.is_video_file(path)]
+            self.add_input_files(files)
+            if files:
+                self.update_status(f"Adicionados {len(files)} arquivo(s)")
+            if folders:
+                self.update_status(f"Varrendo {len(folders)} pasta(s)...")
+                self.scan_dropped_folders(folders)
         except Exception as e:
             self.debug_print(f"❌ [DEBUG] Erro no drop: {e}")
             messagebox.showerror("Erro", f"Erro ao processar arquivos: {e}")
@@ -278,6 +260,41 @@ class VideoConverterGUI:
         video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.ts', '.m4v', '.3gp'}
         return Path(file_path).suffix.lower() in video_extensions
     
+    def add_input_files(self, paths):
+        """Acrescenta arquivos à lista (ignorando os que já estão nela)"""
+        known = set(self.input_files)
+        for file_path in paths:
+            if file_path not in known:
+                known.add(file_path)
+                self.input_files.append(file_path)
+                self.file_listbox.insert(tk.END, os.path.basename(file_path))
+    
+    def scan_dropped_folders(self, folders, chunk_size=200):
+        """Varre as pastas arrastadas numa thread, entregando os vídeos em blocos via root.after"""
+        extensions = self.converter.supported_video_formats
+        
+        def scan():
+            found = 0
+            chunk = []
+            try:
+                for folder in folders:
+                    self.debug_print(f"🔧 [DEBUG] Varrendo pasta: {folder}")
+                    for entry in scan_media_files(folder, extensions, workers=4):
+                        chunk.append(entry.path)
+                        if len(chunk) >= chunk_size:
+                            found += len(chunk)
+                            self.root.after(0, self.add_input_files, chunk)
+                            chunk = []
+                found += len(chunk)
+                if chunk:
+                    self.root.after(0, self.add_input_files, chunk)
+                self.root.after(0, self.update_status, f"Varredura concluída: {found} vídeo(s)")
+            except Exception as e:
+                self.debug_print(f"❌ [DEBUG] Erro ao varrer pastas: {e}")
+                self.root.after(0, self.update_status, f"Erro ao varrer pastas: {e}")
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
     def select_input_file(self):
         """Selecionar arquivos de entrada"""
         files = filedialog.askopenfilenames(
@@ -288,10 +305,7 @@ class VideoConverterGUI:
             ]
         )
         
-        for file_path in files:
-            if file_path not in self.input_files:
-                self.input_files.append(file_path)
-                self.file_listbox.insert(tk.END, os.path.basename(file_path))
+        self.add_input_files(files)
         
         if files:
             self.update_status(f"Adicionados {len(files)} arquivo(s)")
@@ -327,7 +341,18 @@ class VideoConverterGUI:
             messagebox.showwarning("Aviso", "Uma conversão já está em andamento.")
             return
         
+        # Validar o formato contra o FFmpeg instalado antes de começar o lote
+        output_format = self.settings['output_format'].get()
+        if self.settings['audio_only'].get():
+            problems = self.converter.capabilities.problems(f"saida.{output_format}")
+        else:
+            problems = self.converter.capabilities.problems(f"saida.{output_format}", ['libx264', 'aac'])
+        if problems:
+            messagebox.showerror("FFmpeg sem suporte", "\n".join(problems))
+            return
+        
         self.is_converting = True
+        self.converter.reset_cancel()
         self.convert_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
         
@@ -340,7 +365,24 @@ class VideoConverterGUI:
         try:
             total_files = len(self.input_files)
             
-            for i, input_file in enumerate(self.input_files):
+            # Pesar o progresso do lote pela duração de cada arquivo
+            self.update_status("Analisando duração dos arquivos...")
+            infos = [self.converter.get_video_info(f) for f in self.input_files]
+            
+            # Ordenar pelo custo estimado (mais longos primeiro termina o lote antes; mais curtos dão resultados antes)
+            order = list(range(total_files))
+            policy = self.settings['job_order'].get()
+            if policy != 'fifo':
+                order.sort(key=lambda i: JobScheduler.estimate_cost(infos[i]), reverse=policy == 'longest')
+            files = [self.input_files[i] for i in order]
+            
+            weights = [infos[i].get('duration') or 0 for i in order]
+            if not all(weights):
+                weights = [1.0] * total_files
+            total_weight = sum(weights)
+            done_weight = 0.0
+            
+            for i, input_file in enumerate(files):
                 if not self.is_converting:  # Verificar se foi cancelado
                     break
                 
@@ -359,15 +401,21 @@ class VideoConverterGUI:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     output_file = os.path.join(output_dir, f"{base_name}_{timestamp}.{output_format}")
                 
+                progress_callback = self.make_progress_callback(
+                    filename, i, total_files, done_weight, weights[i], total_weight
+                )
+                
                 try:
                     # Converter arquivo
                     if self.settings['audio_only'].get():
-                        self.converter.convert_to_audio(input_file, output_file)
+                        self.converter.convert_to_audio(input_file, output_file,
+                                                        progress_callback=progress_callback)
                     else:
                         self.converter.convert_video(
                             input_file, 
                             output_file,
-                            quality=self.settings['quality'].get()
+                            quality=self.settings['quality'].get(),
+                            progress_callback=progress_callback
                         )
                     
                     self.debug_print(f"✅ [DEBUG] Conversão concluída: {output_file}")
@@ -377,8 +425,9 @@ class VideoConverterGUI:
                     messagebox.showerror("Erro de Conversão", f"Erro ao converter {filename}:\n{str(e)}")
                 
                 # Atualizar progresso
-                progress = ((i + 1) / total_files) * 100
-                self.progress_var.set(progress)
+                done_weight += weights[i]
+                progress = (done_weight / total_weight) * 100
+                self.root.after(0, lambda p=progress: self.progress_var.set(p))
             
             if self.is_converting:
                 self.update_status("✅ Conversão concluída com sucesso!")
@@ -395,10 +444,30 @@ class VideoConverterGUI:
             self.stop_btn.config(state="disabled")
             self.progress_var.set(0)
     
+    def make_progress_callback(self, filename, index, total_files, done_weight, weight, total_weight):
+        """Criar callback que converte o progresso do ffmpeg em progresso do lote"""
+        def on_progress(event):
+            fraction = (event['percent'] or 0) / 100
+            progress = (done_weight + fraction * weight) / total_weight * 100
+            
+            details = [f"{event['percent'] or 0:.0f}%"]
+            if event['speed']:
+                details.append(f"{event['speed']:.2f}x")
+            if event['fps']:
+                details.append(f"{event['fps']:.0f} fps")
+            if event['eta'] is not None:
+                details.append(f"restam {int(event['eta']) // 60:02d}:{int(event['eta']) % 60:02d}")
+            message = f"Convertendo {filename} ({index+1}/{total_files}) - {' | '.join(details)}"
+            
+            self.root.after(0, lambda: (self.progress_var.set(progress), self.status_var.set(message)))
+        return on_progress
+    
     def stop_conversion(self):
         """Parar conversão"""
         self.is_converting = False
         self.update_status("Parando conversão...")
+        # Encerrar o ffmpeg atual fora da thread da interface
+        threading.Thread(target=self.converter.cancel, daemon=True).start()
     
     def update_status(self, message):
         """Atualizar status na interface"""
@@ -406,19 +475,25 @@ class VideoConverterGUI:
         self.root.update_idletasks()
     
     def check_ffmpeg_on_startup(self):
-        """Verificar FFmpeg na inicialização"""
-        try:
-            subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-            self.debug_print("✅ [DEBUG] FFmpeg encontrado")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            messagebox.showwarning(
-                "FFmpeg não encontrado",
-                "FFmpeg não foi encontrado no sistema.\n\n"
-                "Para instalar:\n"
-                "• Windows: winget install FFmpeg\n"
-                "• Ou baixe em: https://ffmpeg.org/download.html\n\n"
-                "Reinicie o terminal após a instalação."
-            )
+        """Verificar FFmpeg numa thread, sem atrasar a abertura da janela"""
+        def check():
+            # Capacidades em cache: só roda o ffmpeg se o executável mudou
+            if self.converter.check_ffmpeg():
+                self.debug_print("✅ [DEBUG] FFmpeg encontrado")
+            else:
+                self.root.after(0, self.show_ffmpeg_missing)
+        
+        threading.Thread(target=check, daemon=True, name='ffmpeg-check').start()
+    
+    def show_ffmpeg_missing(self):
+        messagebox.showwarning(
+            "FFmpeg não encontrado",
+            "FFmpeg não foi encontrado no sistema.\n\n"
+            "Para instalar:\n"
+            "• Windows: winget install FFmpeg\n"
+            "• Ou baixe em: https://ffmpeg.org/download.html\n\n"
+            "Reinicie o terminal após a instalação."
+        )
     
     def save_settings(self):
         """Salvar configurações"""
@@ -428,6 +503,7 @@ class VideoConverterGUI:
                 'quality': self.settings['quality'].get(),
                 'audio_only': self.settings['audio_only'].get(),
                 'overwrite': self.settings['overwrite'].get(),
+                'job_order': self.settings['job_order'].get(),
                 'output_directory': self.output_directory.get()
             }
             
@@ -451,6 +527,7 @@ class VideoConverterGUI:
                 self.settings['quality'].set(settings_data.get('quality', 'medium'))
                 self.settings['audio_only'].set(settings_data.get('audio_only', False))
                 self.settings['overwrite'].set(settings_data.get('overwrite', True))
+                self.settings['job_order'].set(settings_data.get('job_order', 'fifo'))
                 self.output_directory.set(settings_data.get('output_directory', ''))
                 
                 self.debug_print("✅ [DEBUG] Configurações carregadas")
@@ -10,14 +10,6 @@ import subprocess
 import traceback
 
 # Importações condicionais
-try:
-    import cv2
-    OPENCV_AVAILABLE = True
-    print("🔧 [DEBUG] OpenCV carregado com sucesso")
-except ImportError:
-    OPENCV_AVAILABLE = False
-    print("⚠️  [DEBUG] OpenCV não disponível")
-
 try:
     from tkinterdnd2 import DND_FILES, TkinterDnD
     DND_AVAILABLE = True
@@ -26,15 +18,7 @@ except ImportError:
     DND_AVAILABLE = False
     print("⚠️  [DEBUG] tkinterdnd2 não disponível")
 
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-    print("🔧 [DEBUG] Pillow carregado com sucesso")
-except ImportError:
-    PIL_AVAILABLE = False
-    print("⚠️  [DEBUG] Pillow não disponível")
-
-from video_converter import VideoConverter
+from video_converter import VideoConverter, scan_media_files
 
 class VideoConverterGUILite:
     def __init__(self):
@@ -414,17 +398,28 @@ class VideoConverterGUILite:
             if folder:
                 print(f"🔧 [DEBUG] Pasta selecionada: {folder}")
                 
-                video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.ts', '.m2ts']
-                
-                for file_path in Path(folder).iterdir():
-                    if file_path.is_file() and file_path.suffix.lower() in video_extensions:
-                        self.add_file(str(file_path))
-                        print(f"✅ [DEBUG] Arquivo da pasta adicionado: {file_path}")
+                self.update_status(f"📂 Varrendo pasta: {os.path.basename(folder)}...")
+                threading.Thread(target=self.scan_input_folder, args=(folder,), daemon=True).start()
                         
         except Exception as e:
             print(f"❌ [DEBUG] Erro ao selecionar pasta: {e}")
             print(f"🔧 [DEBUG] Traceback: {traceback.format_exc()}")
     
+    def scan_input_folder(self, folder):
+        """Varre a pasta fora da thread da interface; os arquivos entram via root.after"""
+        video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.ts', '.m2ts']
+        
+        try:
+            found = 0
+            for entry in scan_media_files(folder, video_extensions, recursive=False):
+                self.root.after(0, self.add_file, entry.path)
+                found += 1
+            print(f"✅ [DEBUG] Varredura concluída: {found} arquivo(s) em {folder}")
+            self.root.after(0, self.update_status, f"📂 {found} vídeo(s) encontrado(s) na pasta")
+        except Exception as e:
+            print(f"❌ [DEBUG] Erro ao varrer pasta: {e}")
+            print(f"🔧 [DEBUG] Traceback: {traceback.format_exc()}")
+    
     def add_file(self, file_path):
         """Adicionar arquivo à lista"""
         print(f"🔧 [DEBUG] Adicionando arquivo: {file_path}")
@@ -492,6 +487,7 @@ class VideoConverterGUILite:
             print(f"🔧 [DEBUG] Configurações: {[(k, v.get()) for k, v in self.settings.items()]}")
             
             self.is_converting = True
+            self.converter.reset_cancel()
             self.convert_btn.config(state='disabled')
             self.stop_btn.config(state='normal')
             self.progress_var.set(0)
@@ -515,6 +511,15 @@ class VideoConverterGUILite:
         total = len(self.input_files)
         
         try:
+            # Pesar o progresso do lote pela duração de cada arquivo
+            weights = [self.converter.get_video_info(f).get('duration') or 0 for f in self.input_files]
+            if not all(weights):
+                print("⚠️  [DEBUG] Duração indisponível para algum arquivo, usando pesos iguais")
+                weights = [1.0] * total
+            total_weight = sum(weights)
+            done_weight = 0.0
+            print(f"🔧 [DEBUG] Pesos do lote (duração): {weights}")
+            
             for i, input_file in enumerate(self.input_files):
                 if not self.is_converting:
                     print("⚠️  [DEBUG] Conversão interrompida pelo usuário")
@@ -531,6 +536,13 @@ class VideoConverterGUILite:
                 
                 print(f"🔧 [DEBUG] Arquivo de saída: {output_file}")
                 
+                def on_progress(event, base=done_weight, weight=weights[i]):
+                    fraction = (event['percent'] or 0) / 100
+                    progress = (base + fraction * weight) / total_weight * 100
+                    self.root.after(0, lambda p=progress: self.progress_var.set(p))
+                    if event['done']:
+                        print(f"🔧 [DEBUG] ffmpeg terminou: {event['out_time']:.1f}s processados")
+                
                 try:
                     # ✅ CORREÇÃO: Remover parâmetro output_format inválido
                     print("🔧 [DEBUG] Chamando converter.convert_video...")
@@ -545,14 +557,16 @@ class VideoConverterGUILite:
                         success = self.converter.convert_to_audio(
                             input_file,
                             output_file,
-                            audio_codec=self.settings['output_format'].get() if self.settings['output_format'].get() in ['mp3', 'aac', 'wav'] else 'mp3'
+                            audio_codec=self.settings['output_format'].get() if self.settings['output_format'].get() in ['mp3', 'aac', 'wav'] else 'mp3',
+                            progress_callback=on_progress
                         )
                     else:
                         print("🔧 [DEBUG] Conversão de vídeo")
                         success = self.converter.convert_video(
                             input_file,
                             output_file,
-                            quality=self.settings['quality'].get()
+                            quality=self.settings['quality'].get(),
+                            progress_callback=on_progress
                         )
                     
                     print(f"🔧 [DEBUG] Resultado da conversão: {success}")
@@ -563,7 +577,8 @@ class VideoConverterGUILite:
                     else:
                         print(f"❌ [DEBUG] Falha na conversão: {input_file}")
                     
-                    progress = ((i + 1) / total) * 100
+                    done_weight += weights[i]
+                    progress = (done_weight / total_weight) * 100
                     self.root.after(0, lambda p=progress: self.progress_var.set(p))
                     print(f"🔧 [DEBUG] Progresso: {progress:.1f}%")
                     
@@ -588,7 +603,9 @@ class VideoConverterGUILite:
         try:
             self.is_converting = False
             self.update_status("⏹️ Conversão interrompida pelo usuário")
-            print("✅ [DEBUG] Conversão parada")
+            # Encerrar o ffmpeg atual fora da thread da interface
+            threading.Thread(target=self.converter.cancel, daemon=True).start()
+            print("✅ [DEBUG] Cancelamento do ffmpeg solicitado")
             
         except Exception as e:
             print(f"❌ [DEBUG] Erro ao parar conversão: {e}")
@@ -709,6 +726,7 @@ class VideoConverterGUILite:
             if self.is_converting:
                 if messagebox.askokcancel("Fechar", "Conversão em andamento. Deseja realmente fechar?"):
                     self.is_converting = False
+                    self.converter.cancel()
                     self.save_settings()
                     self.root.destroy()
                     print("✅ [DEBUG] Aplicação fechada (conversão interrompida)")
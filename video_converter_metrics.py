@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Buckets fixos: nomes e limites estáveis para dashboards e alertas
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+REALTIME_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+PROBE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUEUE_WAIT_BUCKETS = (0.1, 1, 5, 30, 60, 300, 900, 3600, 14400)
+
+
+class _Histogram:
+    """Histograma cumulativo no formato do Prometheus (um por combinação de labels)"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class ConverterMetrics:
+    """Contadores, gauges e histogramas do conversor
+    
+    Cada atualização é uma soma sob um lock, então o custo no caminho de
+    conversão é desprezível. render() gera o formato texto do Prometheus.
+    """
+    
+    HELP = {
+        'video_converter_jobs_started_total': ('counter', 'Conversões iniciadas'),
+        'video_converter_jobs_succeeded_total': ('counter', 'Conversões concluídas com sucesso'),
+        'video_converter_jobs_failed_total': ('counter', 'Conversões que falharam'),
+        'video_converter_jobs_cancelled_total': ('counter', 'Conversões canceladas'),
+        'video_converter_encode_seconds_total': ('counter', 'Tempo de parede gasto em conversões'),
+        'video_converter_input_bytes_total': ('counter', 'Bytes lidos dos arquivos de entrada'),
+        'video_converter_output_bytes_total': ('counter', 'Bytes gravados nos arquivos de saída'),
+        'video_converter_probe_cache_hits_total': ('counter', 'Acertos do cache de probe'),
+        'video_converter_probe_cache_misses_total': ('counter', 'Falhas do cache de probe'),
+        'video_converter_job_duration_seconds': ('histogram', 'Duração de cada conversão'),
+        'video_converter_realtime_factor': ('histogram', 'Segundos de mídia por segundo de conversão'),
+        'video_converter_probe_duration_seconds': ('histogram', 'Latência do ffprobe (falhas de cache)'),
+        'video_converter_queue_wait_seconds': ('histogram', 'Espera de um job na fila do lote'),
+        'video_converter_queue_depth': ('gauge', 'Jobs aguardando na fila do lote'),
+        'video_converter_ffmpeg_processes': ('gauge', 'Processos ffmpeg em execução'),
+    }
+    
+    BUCKETS = {
+        'video_converter_job_duration_seconds': DURATION_BUCKETS,
+        'video_converter_realtime_factor': REALTIME_BUCKETS,
+        'video_converter_probe_duration_seconds': PROBE_BUCKETS,
+        'video_converter_queue_wait_seconds': QUEUE_WAIT_BUCKETS,
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, _Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._collectors: List[Callable[['ConverterMetrics'], None]] = []
+    
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+    
+    def set_counter(self, name: str, value: float, **labels):
+        """Para contadores mantidos em outro lugar (lidos na hora da coleta)"""
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] = value
+    
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.BUCKETS[name])
+            histogram.observe(value)
+    
+    def gauge(self, name: str, read: Callable[[], float]):
+        """Registra um gauge lido só na hora da coleta"""
+        self._gauges[name] = read
+    
+    def add_collector(self, collect: Callable[['ConverterMetrics'], None]):
+        """Função chamada antes de cada render() para atualizar valores externos"""
+        self._collectors.append(collect)
+    
+    @staticmethod
+    def _labels(labels: tuple, extra: Optional[tuple] = None) -> str:
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ''
+        escaped = []
+        for name, value in items:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{name}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+    
+    @staticmethod
+    def _number(value: float) -> str:
+        value = float(value)
+        return str(int(value)) if value.is_integer() else repr(value)
+    
+    def render(self) -> str:
+        """Exposição no formato texto do Prometheus (versão 0.0.4)"""
+        for collect in self._collectors:
+            collect(self)
+        
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.total, h.count, h.buckets) for key, h in self._histograms.items()}
+        
+        lines = []
+        for name, (kind, help_text) in self.HELP.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{self._labels(labels)} {self._number(value)}')
+            elif kind == 'gauge':
+                read = self._gauges.get(name)
+                if read:
+                    lines.append(f'{name} {self._number(read())}')
+            else:
+                for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{self._labels(labels, ("le", self._number(bound)))} {cumulative}')
+                    lines.append(f'{name}_bucket{self._labels(labels, ("le", "+Inf"))} {count}')
+                    lines.append(f'{name}_sum{self._labels(labels)} {self._number(total)}')
+                    lines.append(f'{name}_count{self._labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Endpoint HTTP local (/metrics) servindo as métricas do conversor"""
+    
+    def __init__(self, metrics: ConverterMetrics, port: int = 9101, host: str = '127.0.0.1'):
+        # http.server só é importado quando o endpoint é usado (abertura das GUIs)
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass  # Sem log por requisição: o Prometheus consulta a cada poucos segundos
+        
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='metrics')
+    
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+    
+    def start(self) -> 'MetricsServer':
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
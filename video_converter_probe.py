@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from video_converter import VideoConverter
+
+ProbeCallback = Callable[[Hashable, dict], None]
+
+
+class ProbePool:
+    """Executa ffprobe em segundo plano com um número limitado de workers
+    
+    Cada pedido tem uma chave (por exemplo, o id da linha na lista) e uma
+    prioridade; prioritize() passa à frente as linhas que estão visíveis e
+    cancel() descarta pedidos de linhas removidas. O resultado passa pelo
+    cache de probe do conversor, então reabrir a mesma pasta é imediato.
+    """
+    
+    VISIBLE = 0
+    NORMAL = 1
+    
+    def __init__(self, converter: VideoConverter, workers: int = 4):
+        self.converter = converter
+        self._heap = []
+        self._entries: Dict[Hashable, list] = {}   # chave -> [prioridade, seq, chave, caminho, callback, válido]
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._worker, daemon=True, name='probe')
+                         for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+    
+    def submit(self, key: Hashable, path: str, callback: ProbeCallback, priority: int = NORMAL):
+        """Agenda o probe de path; callback(chave, info) roda numa thread de trabalho"""
+        with self._condition:
+            self._discard(key)
+            entry = [priority, next(self._counter), key, path, callback, True]
+            self._entries[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._condition.notify()
+    
+    def prioritize(self, keys: Iterable[Hashable]):
+        """Passa os pedidos ainda pendentes destas chaves para a frente da fila"""
+        with self._condition:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] == self.VISIBLE:
+                    continue
+                entry[5] = False   # A entrada antiga fica no heap e é ignorada
+                new_entry = [self.VISIBLE, next(self._counter)] + entry[2:5] + [True]
+                self._entries[key] = new_entry
+                heapq.heappush(self._heap, new_entry)
+            self._condition.notify_all()
+    
+    def cancel(self, keys: Iterable[Hashable]):
+        """Descarta os pedidos pendentes destas chaves"""
+        with self._condition:
+            for key in keys:
+                self._discard(key)
+    
+    def clear(self):
+        """Descarta todos os pedidos pendentes"""
+        with self._condition:
+            self._heap.clear()
+            self._entries.clear()
+    
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._entries)
+    
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[5] = False
+    
+    def _next(self) -> Optional[list]:
+        with self._condition:
+            while True:
+                while self._heap and not self._heap[0][5]:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    entry = heapq.heappop(self._heap)
+                    del self._entries[entry[2]]
+                    return entry
+                if self._closed:
+                    return None
+                self._condition.wait()
+    
+    def _worker(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                break
+            _, _, key, path, callback, _ = entry
+            info = self.converter.get_video_info(path)
+            try:
+                callback(key, info)
+            except Exception as e:
+                print(f"Erro ao entregar probe de {path}: {e}")
+    
+    def shutdown(self):
+        """Descarta os pendentes e encerra os workers"""
+        with self._condition:
+            self._closed = True
+            self._heap.clear()
+            self._entries.clear()
+            self._condition.notify_all()
@@ -0,0 +1,476 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from video_converter import VideoConverter
+
+
+class _Job:
+    """Estado de um job do servidor (só o último evento de progresso é guardado)"""
+    
+    __slots__ = ('id', 'input', 'output', 'quality', 'resolution', 'audio_only', 'ts_optimized', 'overwrite',
+                 'status', 'progress', 'submitted', 'started', 'finished', 'version', 'slot')
+    
+    def __init__(self, job_id: str, request: dict):
+        self.id = job_id
+        self.input = request['input']
+        self.output = request['output']
+        self.quality = request['quality']
+        self.resolution = request['resolution']
+        self.audio_only = request['audio_only']
+        self.ts_optimized = request['ts_optimized']
+        self.overwrite = request['overwrite']
+        self.status = 'queued'
+        self.progress: Optional[dict] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.version = 0
+        self.slot: Optional[Tuple[VideoConverter, threading.Lock]] = None
+    
+    @property
+    def done(self) -> bool:
+        return self.status in JobServer.FINISHED
+    
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'input': self.input,
+            'output': self.output,
+            'quality': self.quality,
+            'resolution': self.resolution,
+            'audio_only': self.audio_only,
+            'ts_optimized': self.ts_optimized,
+            'overwrite': self.overwrite,
+            'progress': self.progress,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+class JobServer:
+    """Servidor HTTP local que enfileira e executa conversões
+    
+    POST   /jobs              enfileira {"input", "output", "quality", "resolution",
+                              "audio_only", "ts_optimized", "overwrite"} (application/json);
+                              202, 409 se a saída já existe, 415, ou 429 com a fila cheia
+    GET    /jobs              lista (?status=queued&limit=100)
+    GET    /jobs/<id>         estado e último progresso
+    GET    /jobs/<id>/events  progresso em Server-Sent Events até o fim do job
+    DELETE /jobs/<id>         cancela (tira da fila ou interrompe o ffmpeg)
+    GET    /metrics           métricas do conversor (Prometheus)
+    
+    Cada worker tem o seu VideoConverter (cancel() interrompe só o job
+    dele), compartilhando cache de probe, capacidades e métricas. A fila
+    tem tamanho máximo e só os últimos `keep_finished` jobs terminados
+    ficam em memória, então o consumo não cresce com o tempo de execução.
+    
+    Com `output_dir` as saídas ficam confinadas a esse diretório (caminhos
+    relativos são resolvidos nele). Arquivos existentes só são
+    sobrescritos com `allow_overwrite` e "overwrite": true no pedido.
+    """
+    
+    FINISHED = ('done', 'failed', 'cancelled')
+    STATUSES = ('queued', 'running', 'cancelling') + FINISHED
+    RESOLUTION_PATTERN = re.compile(r'^\d+x\d+$')
+    
+    def __init__(self, converter: Optional[VideoConverter] = None, port: int = 8765, host: str = '127.0.0.1',
+                 workers: int = 2, max_queue: int = 1000, keep_finished: int = 1000,
+                 output_dir: Optional[str] = None, allow_overwrite: bool = False):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        self.converter = converter or VideoConverter()
+        self.output_dir = os.path.realpath(output_dir) if output_dir else None
+        self.allow_overwrite = allow_overwrite
+        self.max_queue = max(1, max_queue)
+        self.keep_finished = max(0, keep_finished)
+        
+        self._jobs: Dict[str, _Job] = {}
+        self._queue: Deque[_Job] = deque()
+        self._finished: Deque[str] = deque()
+        self._running = 0
+        self._closing = False
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+        
+        self._slots: List[Tuple[VideoConverter, threading.Lock]] = []
+        for _ in range(max(1, workers)):
+            worker_converter = VideoConverter(self.converter.cache_dir, probe_cache=self.converter.probe_cache)
+            worker_converter.capabilities = self.converter.capabilities
+            worker_converter.metrics = self.converter.metrics
+            worker_converter.ffmpeg_threads = self.converter.ffmpeg_threads
+            self._slots.append((worker_converter, threading.Lock()))
+        
+        metrics = self.converter.metrics
+        metrics.gauge('video_converter_queue_depth', lambda: len(self._queue))
+        metrics.gauge('video_converter_ffmpeg_processes',
+                      lambda: sum(len(worker._processes) for worker, _ in self._slots))
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, payload, headers: Optional[dict] = None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _route(self) -> Tuple[List[str], dict]:
+                url = urlsplit(self.path)
+                return [part for part in url.path.split('/') if part], parse_qs(url.query)
+            
+            def do_GET(self):
+                parts, query = self._route()
+                if parts == ['metrics']:
+                    body = metrics.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif parts == ['jobs']:
+                    status = query.get('status', [None])[0]
+                    try:
+                        limit = int(query.get('limit', ['100'])[0])
+                    except ValueError:
+                        limit = 100
+                    self._send_json(200, server.list_jobs(status, limit))
+                elif len(parts) == 2 and parts[0] == 'jobs':
+                    job = server.get_job(parts[1])
+                    if job is None:
+                        self._send_json(404, {'error': 'job não encontrado'})
+                    else:
+                        self._send_json(200, job)
+                elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+                    self._stream_events(parts[1])
+                else:
+                    self._send_json(404, {'error': 'rota não encontrada'})
+            
+            def do_POST(self):
+                parts, _ = self._route()
+                if parts != ['jobs']:
+                    self._send_json(404, {'error': 'rota não encontrada'})
+                    return
+                content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+                if content_type != 'application/json':
+                    self._send_json(415, {'error': 'use Content-Type: application/json'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(request, dict):
+                        raise ValueError('o corpo deve ser um objeto JSON')
+                except ValueError as e:
+                    self._send_json(400, {'error': f'JSON inválido: {e}'})
+                    return
+                status, payload = server.submit(request)
+                headers = {'Location': f"/jobs/{payload['id']}"} if status == 202 else {}
+                if status == 429:
+                    headers['Retry-After'] = '5'
+                self._send_json(status, payload, headers)
+            
+            def do_DELETE(self):
+                parts, _ = self._route()
+                if len(parts) != 2 or parts[0] != 'jobs':
+                    self._send_json(404, {'error': 'rota não encontrada'})
+                    return
+                status, payload = server.cancel_job(parts[1])
+                self._send_json(status, payload)
+            
+            def _stream_events(self, job_id: str):
+                if server.get_job(job_id) is None:
+                    self._send_json(404, {'error': 'job não encontrado'})
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                try:
+                    for event, data in server.events(job_id):
+                        if event is None:
+                            self.wfile.write(b': keepalive\n\n')
+                        else:
+                            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Cliente desistiu de acompanhar; o job continua
+            
+            def log_message(self, format, *args):
+                pass  # Sem log por requisição: clientes consultam o progresso o tempo todo
+        
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='job-server')
+        self._workers = [threading.Thread(target=self._worker, args=(slot,), daemon=True, name=f'job-worker-{index}')
+                         for index, slot in enumerate(self._slots)]
+    
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def _normalize(self, request: dict) -> dict:
+        """Valida um pedido de job e completa os valores padrão (ValueError se inválido)"""
+        input_path = request.get('input')
+        if not input_path or not isinstance(input_path, str):
+            raise ValueError("campo 'input' obrigatório")
+        input_path = os.path.abspath(input_path)
+        if not os.path.isfile(input_path):
+            raise ValueError(f"arquivo não encontrado: {input_path}")
+        
+        quality = request.get('quality') or 'medium'
+        if quality not in VideoConverter.QUALITY_SETTINGS:
+            raise ValueError(f"qualidade inválida: {quality}")
+        resolution = request.get('resolution') or None
+        if resolution and not self.RESOLUTION_PATTERN.match(str(resolution)):
+            raise ValueError(f"resolução inválida: {resolution} (use LARGURAxALTURA)")
+        audio_only = bool(request.get('audio_only'))
+        ts_optimized = bool(request.get('ts_optimized'))
+        
+        overwrite = bool(request.get('overwrite'))
+        if overwrite and not self.allow_overwrite:
+            raise ValueError("sobrescrita desativada neste servidor (inicie com --allow-overwrite)")
+        
+        suffix = '.mp3' if audio_only else '.mp4'
+        output_path = request.get('output')
+        if output_path and not isinstance(output_path, str):
+            raise ValueError("campo 'output' deve ser um caminho")
+        if self.output_dir:
+            output_path = os.path.realpath(os.path.join(self.output_dir, output_path or Path(input_path).stem + suffix))
+            if not output_path.startswith(self.output_dir + os.sep):
+                raise ValueError(f"a saída deve ficar dentro de {self.output_dir}")
+        else:
+            output_path = os.path.abspath(output_path or str(Path(input_path).with_suffix(suffix)))
+        if os.path.realpath(output_path) == os.path.realpath(input_path):
+            raise ValueError("a saída não pode ser o próprio arquivo de entrada")
+        if os.path.exists(output_path) and not overwrite:
+            raise FileExistsError(f"a saída já existe: {output_path}")
+        
+        codecs = [] if audio_only or ts_optimized else ['libx264', 'aac']
+        problems = self.converter.capabilities.problems(output_path, codecs)
+        if problems:
+            raise ValueError('; '.join(problems))
+        
+        return {'input': input_path, 'output': output_path, 'quality': quality, 'resolution': resolution,
+                'audio_only': audio_only, 'ts_optimized': ts_optimized, 'overwrite': overwrite}
+    
+    def submit(self, request: dict) -> Tuple[int, dict]:
+        """Enfileira um job; retorna (status HTTP, corpo)"""
+        try:
+            request = self._normalize(request)
+        except FileExistsError as e:
+            return 409, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        
+        with self._changed:
+            if self._closing:
+                return 503, {'error': 'servidor encerrando'}
+            if len(self._queue) >= self.max_queue:
+                return 429, {'error': 'fila cheia', 'queued': len(self._queue), 'max_queue': self.max_queue}
+            job = _Job(str(next(self._ids)), request)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._changed.notify_all()
+            return 202, job.to_dict()
+    
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+    
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> dict:
+        """Jobs mais recentes primeiro (no máximo `limit`)"""
+        with self._changed:
+            jobs = []
+            for job in reversed(self._jobs.values()):
+                if len(jobs) >= limit:
+                    break
+                if status is None or job.status == status:
+                    jobs.append(job.to_dict())
+            return {'jobs': jobs, 'queued': len(self._queue), 'running': self._running,
+                    'max_queue': self.max_queue, 'workers': len(self._slots)}
+    
+    def cancel_job(self, job_id: str) -> Tuple[int, dict]:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return 404, {'error': 'job não encontrado'}
+            if job.status == 'queued':
+                self._queue.remove(job)
+                self._finish(job, 'cancelled')
+                return 200, job.to_dict()
+            if job.status == 'cancelling':
+                return 200, job.to_dict()
+            if job.status != 'running':
+                return 409, {'error': f'job já terminou ({job.status})'}
+            slot = job.slot
+        
+        worker_converter, lock = slot
+        # O lock do worker impede que o cancelamento atinja o job seguinte
+        with lock:
+            if job.slot is slot:
+                with self._changed:
+                    job.status = 'cancelling'
+                    job.version += 1
+                    self._changed.notify_all()
+                worker_converter.cancel()
+        return 200, self.get_job(job_id) or job.to_dict()
+    
+    def events(self, job_id: str, keepalive: float = 15.0):
+        """Gera ('progress' | 'status' | 'done', dados) até o job terminar; (None, None) é keepalive"""
+        seen = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                if job.version == seen and not job.done:
+                    self._changed.wait(keepalive)
+                if job.version == seen and not job.done:
+                    item = (None, None)
+                else:
+                    seen = job.version
+                    if job.done:
+                        item = ('done', job.to_dict())
+                    elif job.progress:
+                        item = ('progress', job.progress)
+                    else:
+                        item = ('status', {'status': job.status})
+            yield item
+            if item[0] == 'done':
+                return
+    
+    def _finish(self, job: _Job, status: str):
+        """Marca o job como terminado e descarta os mais antigos (chamar com _changed)"""
+        job.status = status
+        job.finished = time.time()
+        job.slot = None
+        job.version += 1
+        self._finished.append(job.id)
+        while len(self._finished) > self.keep_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+        self._changed.notify_all()
+    
+    def _worker(self, slot: Tuple[VideoConverter, threading.Lock]):
+        worker_converter, lock = slot
+        while True:
+            with self._changed:
+                while not self._queue and not self._closing:
+                    self._changed.wait()
+                if self._closing:
+                    return
+                job = self._queue.popleft()
+                job.status = 'running'
+                job.started = time.time()
+                job.slot = slot
+                job.version += 1
+                self._running += 1
+                self._changed.notify_all()
+            
+            self.converter.metrics.observe('video_converter_queue_wait_seconds', job.started - job.submitted)
+            
+            def on_progress(event, job=job):
+                with self._changed:
+                    job.progress = event
+                    job.version += 1
+                    self._changed.notify_all()
+            
+            try:
+                success = self._execute(worker_converter, job, on_progress)
+            except Exception as e:
+                print(f"Erro inesperado no job {job.id}: {e}")
+                success = False
+            
+            with lock:
+                cancelled = worker_converter.cancelled
+                worker_converter.reset_cancel()
+                with self._changed:
+                    self._running -= 1
+                    self._finish(job, 'cancelled' if cancelled else 'done' if success else 'failed')
+    
+    @staticmethod
+    def _execute(worker_converter: VideoConverter, job: _Job, on_progress) -> bool:
+        # A saída pode ter sido criada enquanto o job esperava na fila
+        if not job.overwrite and os.path.exists(job.output):
+            print(f"Job {job.id}: a saída já existe, não será sobrescrita: {job.output}")
+            return False
+        Path(job.output).parent.mkdir(parents=True, exist_ok=True)
+        if job.audio_only:
+            return worker_converter.convert_to_audio(job.input, job.output, progress_callback=on_progress)
+        if job.ts_optimized:
+            return worker_converter.ts_to_mp4_optimized(job.input, job.output, progress_callback=on_progress)
+        return worker_converter.convert_video(job.input, job.output, quality=job.quality,
+                                              resolution=job.resolution, progress_callback=on_progress)
+    
+    def start(self) -> 'JobServer':
+        for worker in self._workers:
+            worker.start()
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Para de aceitar jobs, interrompe os que estão rodando e descarta a fila"""
+        with self._changed:
+            self._closing = True
+            while self._queue:
+                self._finish(self._queue.popleft(), 'cancelled')
+            self._changed.notify_all()
+        for worker_converter, lock in self._slots:
+            with lock:
+                worker_converter.cancel()
+        for worker in self._workers:
+            worker.join()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor HTTP local de conversões')
+    parser.add_argument('--host', default='127.0.0.1', help='Endereço (padrão: 127.0.0.1, só esta máquina)')
+    parser.add_argument('--port', type=int, default=8765, help='Porta (padrão: 8765)')
+    parser.add_argument('-j', '--jobs', type=int, default=2, help='Conversões simultâneas (padrão: 2)')
+    parser.add_argument('--max-queue', type=int, default=1000,
+                        help='Jobs aguardando antes de responder 429 (padrão: 1000)')
+    parser.add_argument('--keep-finished', type=int, default=1000,
+                        help='Jobs terminados mantidos para consulta (padrão: 1000)')
+    parser.add_argument('--output-dir', help='Confina as saídas a este diretório')
+    parser.add_argument('--allow-overwrite', action='store_true',
+                        help='Permite sobrescrever saídas existentes com "overwrite": true no pedido')
+    
+    args = parser.parse_args()
+    
+    converter = VideoConverter()
+    if not converter.check_ffmpeg():
+        print("Erro: FFmpeg não encontrado. Instale o FFmpeg primeiro.")
+        sys.exit(1)
+    
+    server = JobServer(converter, args.port, args.host, workers=args.jobs,
+                       max_queue=args.max_queue, keep_finished=args.keep_finished,
+                       output_dir=args.output_dir, allow_overwrite=args.allow_overwrite).start()
+    print(f"Servidor de conversões em {server.address} ({args.jobs} simultâneas, fila de {args.max_queue})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nEncerrando servidor...")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+import os
+import json
+import errno
+import time
+import uuid
+import random
+import socket
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from video_converter import VideoConverter, scan_media_files
+
+# Erros de os.link() em sistemas de arquivos sem hard links (SMB do Windows, exFAT...)
+LINK_UNSUPPORTED = {errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOSYS}
+
+
+class LeaseLock:
+    """Trava com prazo (lease) num sistema de arquivos compartilhado (NFS)
+    
+    A trava é criada com os.link() de um arquivo temporário, que é atômico
+    também em NFS (O_EXCL não é confiável em servidores antigos). SMB só
+    funciona se o servidor oferecer hard links (Samba com extensões Unix);
+    sem eles os.link() falha e a trava levanta um erro explícito. O dono
+    renova o prazo tocando o mtime; uma trava sem renovação há mais de
+    `lease_seconds` é de um nó que caiu e pode ser retomada. `now` deve vir
+    do relógio do servidor de arquivos (ver SharedBatch.server_time).
+    """
+    
+    def __init__(self, path: str, owner: dict, lease_seconds: float = 60.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.token = uuid.uuid4().hex
+        self.owner = dict(owner, token=self.token)
+        # Dados do dono anterior quando a trava foi retomada de um nó que caiu
+        self.previous: Optional[dict] = None
+    
+    @staticmethod
+    def _unsupported(directory: str, error: OSError) -> OSError:
+        return OSError(error.errno, f"o sistema de arquivos de {directory} não suporta hard links (os.link), "
+                                    f"necessários para as travas do lote compartilhado: {error.strerror}")
+    
+    @classmethod
+    def check_support(cls, directory: str):
+        """Levanta OSError se o diretório não aceita os.link()"""
+        probe = os.path.join(directory, f".link-test.{uuid.uuid4().hex}")
+        try:
+            with open(probe, 'w'):
+                pass
+            os.link(probe, probe + '.link')
+            os.remove(probe + '.link')
+        except OSError as e:
+            if e.errno in LINK_UNSUPPORTED:
+                raise cls._unsupported(directory, e) from e
+            raise
+        finally:
+            try:
+                os.remove(probe)
+            except OSError:
+                pass
+    
+    def _link(self) -> bool:
+        temp_path = f"{self.path}.{self.token}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.owner, f)
+        try:
+            os.link(temp_path, self.path)
+            return True
+        except FileExistsError:
+            return False
+        except OSError as e:
+            if e.errno in LINK_UNSUPPORTED:
+                raise self._unsupported(os.path.dirname(self.path), e) from e
+            # Em NFS a resposta de um link bem-sucedido pode se perder: conferir pelo número de links
+            try:
+                return os.stat(temp_path).st_nlink == 2
+            except OSError:
+                return False
+        finally:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _read(path: str) -> dict:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _break_stale(self, now: float) -> bool:
+        """Retira uma trava vencida; False se ela foi renovada nesse meio-tempo"""
+        stale_path = f"{self.path}.{self.token}.stale"
+        try:
+            os.rename(self.path, stale_path)
+        except FileNotFoundError:
+            return True  # Outro nó já retirou
+        except OSError:
+            return False
+        
+        try:
+            # Entre o stat e o rename outro nó pode ter retomado a trava: conferir de novo
+            if now - os.stat(stale_path).st_mtime > self.lease_seconds:
+                self.previous = self._read(stale_path)
+                return True
+            try:
+                os.link(stale_path, self.path)
+            except OSError:
+                pass  # O dono perceberá ao renovar e desistirá do job
+            return False
+        finally:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+    
+    def acquire(self, now: float) -> bool:
+        self.previous = None
+        for _ in range(2):
+            if self._link():
+                return True
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                continue  # Liberada agora mesmo
+            if now - mtime <= self.lease_seconds or not self._break_stale(now):
+                return False
+        return False
+    
+    def renew(self) -> bool:
+        """Renova o prazo; False se a trava não é mais nossa
+        
+        O token é lido e o mtime tocado pelo mesmo descritor, e depois se
+        confere que o caminho ainda é esse arquivo: se outro nó retomou a
+        trava no meio-tempo, o toque caiu no arquivo antigo e não no dele.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                if json.load(f).get('token') != self.token:
+                    return False
+                if os.utime in os.supports_fd:
+                    os.utime(f.fileno())
+                else:
+                    os.utime(self.path)  # Sem futimens; a conferência abaixo ainda vale
+                touched = os.fstat(f.fileno())
+            current = os.stat(self.path)
+        except (OSError, ValueError):
+            return False
+        return (current.st_dev, current.st_ino) == (touched.st_dev, touched.st_ino)
+    
+    def release(self):
+        if self._read(self.path).get('token') == self.token:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class SharedBatch:
+    """Lote cooperativo: vários nós convertendo a mesma pasta compartilhada
+    
+    Não há coordenador. Cada nó varre a entrada em ordem aleatória e
+    reivindica cada arquivo com uma LeaseLock em <saída>/.shared/, renovada
+    por uma thread de heartbeat; se um nó cai, sua trava vence e outro nó
+    retoma o arquivo (apagando a saída parcial dele). A saída é gravada num
+    arquivo temporário e renomeada só depois de o nó confirmar que ainda é
+    o dono. Marcadores .done/.failed (gravados antes de soltar a trava)
+    evitam que outro nó refaça o trabalho. Mais nós = mais jobs simultâneos.
+    
+    Os nomes das travas vêm do caminho relativo à entrada, então cada nó
+    pode montar o compartilhamento num caminho diferente.
+    """
+    
+    def __init__(self, converter: VideoConverter, input_dir: str, output_dir: str,
+                 output_format: str = 'mp4', quality: str = 'medium', workers: int = 1,
+                 recursive: bool = False, ts_optimized: bool = False,
+                 lease_seconds: float = 60.0, poll_interval: float = 5.0, node: Optional[str] = None):
+        self.converter = converter
+        self.input_dir = Path(input_dir).resolve()
+        self.output_dir = Path(output_dir).resolve()
+        self.output_format = output_format
+        self.quality = quality
+        self.workers = max(1, workers)
+        self.recursive = recursive
+        self.ts_optimized = ts_optimized
+        self.lease_seconds = lease_seconds
+        self.poll_interval = min(poll_interval, lease_seconds / 2)
+        self.node = node or f"{socket.gethostname()}-{os.getpid()}"
+        self.settings = {'output_format': output_format, 'quality': quality, 'ts_optimized': ts_optimized}
+        
+        self.state_dir = self.output_dir / '.shared'
+        self.node_file = self.state_dir / 'nodes' / self.node
+        self.node_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._slots = threading.Semaphore(self.workers)
+        self._idle: List[Tuple[VideoConverter, threading.Lock]] = []
+        for _ in range(self.workers):
+            worker_converter = VideoConverter(converter.cache_dir, probe_cache=converter.probe_cache)
+            worker_converter.capabilities = converter.capabilities
+            worker_converter.metrics = converter.metrics
+            worker_converter.ffmpeg_threads = converter.ffmpeg_threads
+            self._idle.append((worker_converter, threading.Lock()))
+        self._held: Dict[str, Tuple[LeaseLock, VideoConverter, threading.Lock]] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self.converted: List[str] = []
+        self.failures = 0
+    
+    def server_time(self) -> float:
+        """Horário do servidor de arquivos (mtime de um arquivo recém-tocado), imune a relógios locais errados"""
+        with open(self.node_file, 'a'):
+            pass
+        os.utime(self.node_file)
+        return os.stat(self.node_file).st_mtime
+    
+    def _job_name(self, relative: str) -> str:
+        return hashlib.sha1(relative.encode('utf-8')).hexdigest()
+    
+    def _marker_matches(self, path: Path, stat: os.stat_result, output_file: Path) -> bool:
+        marker = LeaseLock._read(str(path))
+        return (bool(marker) and marker.get('settings') == self.settings
+                and marker.get('input_size') == stat.st_size
+                and marker.get('input_mtime_ns') == stat.st_mtime_ns
+                and (path.suffix == '.failed' or output_file.exists()))
+    
+    def _finished(self, name: str, stat: os.stat_result, output_file: Path) -> bool:
+        """Já convertido (ou já falhou com este mesmo conteúdo) por algum nó"""
+        return (self._marker_matches(self.state_dir / f"{name}.done", stat, output_file)
+                or self._marker_matches(self.state_dir / f"{name}.failed", stat, output_file))
+    
+    def _write_marker(self, path: Path, relative: str, stat: os.stat_result, output_file: Path):
+        temp_path = f"{path}.{self.node}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'input': relative, 'output': str(output_file), 'settings': self.settings,
+                       'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns,
+                       'node': self.node, 'time': time.time()}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    
+    def _heartbeat(self):
+        """Renova as travas dos jobs em andamento; um job cuja trava se perdeu é interrompido"""
+        while not self._stop_event.wait(self.lease_seconds / 4):
+            try:
+                self.server_time()
+            except OSError:
+                pass
+            with self._lock:
+                held = list(self._held.values())
+            for lease, worker_converter, slot_lock in held:
+                if lease.renew():
+                    continue
+                print(f"Trava perdida: {os.path.basename(lease.path)} (outro nó assumiu o arquivo)")
+                with slot_lock:
+                    with self._lock:
+                        still_running = self._held.get(lease.path, (None,))[0] is lease
+                    if still_running:
+                        worker_converter.cancel()
+    
+    def _run_job(self, lease: LeaseLock, slot: Tuple[VideoConverter, threading.Lock],
+                 file_path: Path, stat: os.stat_result):
+        worker_converter, slot_lock = slot
+        relative, name, output_file = self._job_paths(file_path)
+        partial = output_file.with_name(f".{output_file.stem}.{lease.token[:12]}.part{output_file.suffix}")
+        success = False
+        try:
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            print(f"[{self.node}] Convertendo: {relative} -> {output_file.name}")
+            start = time.perf_counter()
+            if self.ts_optimized and file_path.suffix.lower() == '.ts':
+                success = worker_converter.ts_to_mp4_optimized(str(file_path), str(partial))
+            else:
+                success = worker_converter.convert_video(str(file_path), str(partial), quality=self.quality)
+            elapsed = time.perf_counter() - start
+            
+            lost = not lease.renew()
+            if success and not lost:
+                os.replace(partial, output_file)
+                self._write_marker(self.state_dir / f"{name}.done", relative, stat, output_file)
+                with self._lock:
+                    self.converted.append(str(output_file))
+                print(f"✓ Sucesso: {output_file.name} ({elapsed:.1f}s)")
+            elif not lost and not self._stop_event.is_set() and not worker_converter.cancelled:
+                self._write_marker(self.state_dir / f"{name}.failed", relative, stat, output_file)
+                with self._lock:
+                    self.failures += 1
+                print(f"✗ Falha: {relative}")
+        except Exception as e:
+            print(f"Erro inesperado em {relative}: {e}")
+        finally:
+            if not success and partial.exists():
+                try:
+                    partial.unlink()
+                except OSError:
+                    pass
+            with slot_lock:
+                with self._lock:
+                    self._held.pop(lease.path, None)
+                    self._idle.append(slot)
+                worker_converter.reset_cancel()
+            lease.release()
+            self._slots.release()
+            self._wake.set()
+    
+    def _job_paths(self, file_path: Path) -> Tuple[str, str, Path]:
+        """(caminho relativo à entrada, nome da trava, arquivo de saída)"""
+        relative = file_path.relative_to(self.input_dir).as_posix()
+        output_file = self.output_dir / Path(relative).parent / f"{file_path.stem}.{self.output_format}"
+        return relative, self._job_name(relative), output_file
+    
+    def _claim(self, file_path: Path, stat: os.stat_result, now: float) -> Optional[bool]:
+        """Tenta pegar um arquivo: True se começou, False se está com outro nó, None se já terminou"""
+        relative, name, output_file = self._job_paths(file_path)
+        lease = LeaseLock(str(self.state_dir / f"{name}.lock"),
+                          {'node': self.node, 'input': relative}, self.lease_seconds)
+        if not lease.acquire(now):
+            return False
+        # Outro nó pode ter terminado entre a verificação e a trava
+        if self._finished(name, stat, output_file):
+            lease.release()
+            return None
+        if lease.previous:
+            print(f"Retomando {relative} (nó {lease.previous.get('node', '?')} parou de renovar a trava)")
+            partial = lease.previous.get('token')
+            if partial:
+                for leftover in output_file.parent.glob(f".{output_file.stem}.{partial[:12]}.part*"):
+                    try:
+                        leftover.unlink()
+                    except OSError:
+                        pass
+        
+        with self._lock:
+            slot = self._idle.pop()
+            self._held[lease.path] = (lease, slot[0], slot[1])
+        threading.Thread(target=self._run_job, args=(lease, slot, file_path, stat),
+                         daemon=True).start()
+        return True
+    
+    def run(self) -> List[str]:
+        """Converte até não restar arquivo pendente em nenhum nó; retorna as saídas deste nó"""
+        if not self.converter.check_job(f"saida.{self.output_format}", 'libx264', 'aac'):
+            return []
+        try:
+            LeaseLock.check_support(str(self.state_dir))
+        except OSError as e:
+            print(f"Erro: {e}")
+            return []
+        
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        print(f"Nó {self.node}: {self.input_dir} -> {self.output_dir} ({self.workers} worker(s))")
+        start = time.perf_counter()
+        
+        try:
+            while not self._stop_event.is_set():
+                files = list(scan_media_files(str(self.input_dir), self.converter.supported_video_formats,
+                                              recursive=self.recursive, exclude=[str(self.output_dir)]))
+                # Ordem própria de cada nó: menos disputa pelas mesmas travas
+                random.shuffle(files)
+                elsewhere = 0
+                for entry in files:
+                    if self._stop_event.is_set():
+                        break
+                    file_path = Path(entry.path)
+                    try:
+                        stat = entry.stat()
+                        _, name, output_file = self._job_paths(file_path)
+                        if self._finished(name, stat, output_file):
+                            continue
+                    except OSError:
+                        continue  # Arquivo removido durante a varredura
+                    
+                    # Só reivindicar o que há worker livre para converter agora
+                    self._slots.acquire()
+                    try:
+                        started = self._claim(file_path, stat, self.server_time())
+                    except OSError as e:
+                        print(f"Erro ao reivindicar {entry.name}: {e}")
+                        if e.errno in LINK_UNSUPPORTED:
+                            self._slots.release()
+                            self._stop_event.set()
+                            break
+                        started = False
+                    if not started:
+                        self._slots.release()
+                        elsewhere += started is False
+                
+                with self._lock:
+                    running = len(self._held)
+                if not running and not elsewhere:
+                    break
+                # Esperar um job terminar aqui ou alguma trava de outro nó vencer
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        except KeyboardInterrupt:
+            print("\nEncerrando nó...")
+        finally:
+            self._stop_event.set()
+            with self._lock:
+                held = list(self._held.values())
+            for _, worker_converter, _ in held:
+                worker_converter.cancel()
+            for _ in range(self.workers):
+                self._slots.acquire()
+            try:
+                self.node_file.unlink()
+            except OSError:
+                pass
+        
+        print(f"\nResumo do nó {self.node}: {len(self.converted)} convertidos, {self.failures} falhas, "
+              f"{time.perf_counter() - start:.1f}s")
+        return self.converted
+    
+    def stop(self):
+        """Encerra o nó (pode ser chamado de outra thread); travas dos jobs interrompidos são liberadas"""
+        self._stop_event.set()
+        self._wake.set()
@@ -0,0 +1,222 @@
+import os
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from video_converter import ProbeCache, VideoConverter
+
+ThumbnailCallback = Callable[[str, Optional[bytes]], None]
+
+
+class ThumbnailService:
+    """Gera miniaturas PNG de vídeos em segundo plano
+    
+    O ffmpeg decodifica só quadros-chave a partir de um ponto um pouco depois
+    do início (o primeiro quadro costuma ser preto ou cinza em gravações de
+    TV) e já entrega a imagem reduzida. Os PNGs ficam num LRU em memória e em
+    disco, indexados pela identidade do arquivo (caminho, tamanho, mtime).
+    
+    O disco guarda no máximo `disk_entries` PNGs: cada leitura toca o mtime
+    e, quando o diretório passa de disk_entries * PRUNE_SLACK arquivos, os
+    de mtime mais antigo são apagados até sobrarem disk_entries.
+    """
+    
+    PRUNE_SLACK = 1.25
+    
+    def __init__(self, converter: VideoConverter, cache_dir: Optional[str] = None,
+                 max_size: int = 200, memory_entries: int = 256, workers: int = 2,
+                 timeout: float = 15.0, disk_entries: int = 2000):
+        self.converter = converter
+        self.max_size = max_size
+        self.memory_entries = memory_entries
+        self.disk_entries = max(1, disk_entries)
+        self.timeout = timeout
+        self.cache_dir = cache_dir or os.path.join(converter.cache_dir, 'thumbnails')
+        
+        self._memory = OrderedDict()
+        self._waiting = {}   # chave -> callbacks aguardando a mesma miniatura
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._disk_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+        
+        try:
+            Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            print(f"Cache de miniaturas em disco indisponível: {e}")
+            self.cache_dir = None
+        else:
+            self._disk_count = len(self._disk_files())
+    
+    def _key(self, path: str) -> tuple:
+        return ProbeCache.file_key(path) + (self.max_size,)
+    
+    def _disk_path(self, key: tuple) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+    
+    def _remember(self, key: tuple, data: bytes):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+    
+    def get_cached(self, path: str) -> Optional[bytes]:
+        """Miniatura em memória, sem tocar no disco nem no ffmpeg"""
+        try:
+            key = self._key(path)
+        except OSError:
+            return None
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+    
+    def request(self, path: str, callback: ThumbnailCallback):
+        """Pede a miniatura de path; callback(path, png) é chamado quando ficar pronta
+        
+        Em acerto de memória o callback é chamado imediatamente; nos demais
+        casos, a partir de uma thread de trabalho (png é None em caso de falha).
+        """
+        try:
+            key = self._key(path)
+        except OSError:
+            callback(path, None)
+            return
+        
+        with self._lock:
+            data = self._memory.get(key)
+            if data is None:
+                if key in self._waiting:
+                    self._waiting[key].append(callback)
+                    return
+                self._waiting[key] = [callback]
+        
+        if data is not None:
+            callback(path, data)
+            return
+        self._executor.submit(self._load, path, key)
+    
+    def _load(self, path: str, key: tuple):
+        data = None
+        try:
+            data = self._load_from_disk(key)
+            if data is None:
+                data = self._render(path)
+                if data:
+                    self._save_to_disk(key, data)
+            if data:
+                self._remember(key, data)
+        except Exception as e:
+            print(f"Erro ao gerar miniatura de {path}: {e}")
+        finally:
+            with self._lock:
+                callbacks = self._waiting.pop(key, [])
+            for callback in callbacks:
+                callback(path, data)
+    
+    def _load_from_disk(self, key: tuple) -> Optional[bytes]:
+        disk_path = self._disk_path(key)
+        if not disk_path:
+            return None
+        try:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+            os.utime(disk_path)  # Marca como usada recentemente (LRU)
+            return data
+        except OSError:
+            return None
+    
+    def _save_to_disk(self, key: tuple, data: bytes):
+        disk_path = self._disk_path(key)
+        if not disk_path:
+            return
+        temp_path = f"{disk_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, disk_path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_count += 1
+            full = self._disk_count > self.disk_entries * self.PRUNE_SLACK
+        if full:
+            self._prune_disk()
+    
+    def _disk_files(self) -> list:
+        """(mtime, caminho) dos PNGs do cache em disco"""
+        files = []
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.png'):
+                        try:
+                            files.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return files
+    
+    def _prune_disk(self):
+        """Apaga as miniaturas usadas há mais tempo até sobrarem disk_entries"""
+        if not self._prune_lock.acquire(blocking=False):
+            return  # Outra thread já está limpando
+        try:
+            files = sorted(self._disk_files())
+            removed = 0
+            for _, path in files[:max(0, len(files) - self.disk_entries)]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            with self._lock:
+                self._disk_count = len(files) - removed
+        finally:
+            self._prune_lock.release()
+    
+    def _seek_position(self, path: str) -> float:
+        """Ponto de captura: 10% da duração, limitado a 30s"""
+        duration = self.converter.get_video_info(path).get('duration') or 0
+        return min(duration * 0.1, 30.0) if duration > 2 else 0.0
+    
+    def _render(self, path: str) -> Optional[bytes]:
+        """Decodifica um quadro reduzido com o ffmpeg e devolve o PNG"""
+        seek = self._seek_position(path)
+        data = self._run_ffmpeg(path, seek, keyframes_only=True)
+        if not data and seek:
+            # Arquivo danificado ou duração errada: tenta do início decodificando tudo
+            data = self._run_ffmpeg(path, 0.0, keyframes_only=False)
+        return data
+    
+    def _run_ffmpeg(self, path: str, seek: float, keyframes_only: bool) -> Optional[bytes]:
+        size = self.max_size
+        args = ['ffmpeg', '-v', 'error', '-nostdin']
+        if seek:
+            args += ['-ss', f'{seek:.3f}']
+        if keyframes_only:
+            args += ['-skip_frame', 'nokey']
+        args += [
+            '-i', path, '-map', '0:v:0', '-frames:v', '1',
+            '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease:flags=fast_bilinear',
+            '-f', 'image2pipe', '-c:v', 'png', 'pipe:1'
+        ]
+        try:
+            result = subprocess.run(args, capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            return None
+        return result.stdout if result.returncode == 0 and result.stdout else None
+    
+    def shutdown(self):
+        """Descarta pedidos pendentes e encerra as threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Set
+
+from video_converter import ConversionJournal, VideoConverter
+
+
+class _InotifyWatcher:
+    """Acesso mínimo ao inotify do Linux via ctypes (sem dependências externas)"""
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self, directory: str):
+        import ctypes
+        import ctypes.util
+        
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+        
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch falhou em {directory}')
+        self.directory = directory
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def read_events(self) -> Set[str]:
+        """Lê os eventos pendentes e retorna os caminhos afetados"""
+        paths = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+        
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, _, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if name:
+                paths.add(os.path.join(self.directory, os.fsdecode(name)))
+        return paths
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Converte automaticamente os vídeos que chegam em uma pasta
+    
+    Usa inotify no Linux (com uma varredura periódica de segurança, já que
+    compartilhamentos de rede nem sempre geram eventos) e varredura por
+    polling nos demais sistemas. Um arquivo só entra na fila depois de
+    ficar `settle_seconds` sem crescer. O diário da pasta de saída evita
+    reconverter arquivos depois de um reinício.
+    """
+    
+    def __init__(self, converter: VideoConverter, input_dir: str, output_dir: str,
+                 output_format: str = 'mp4', quality: str = 'medium',
+                 workers: int = 1, queue_size: int = 16, settle_seconds: float = 10.0,
+                 poll_interval: float = 5.0, rescan_interval: float = 60.0,
+                 ts_optimized: bool = False, use_inotify: bool = True):
+        self.converter = converter
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.output_format = output_format
+        self.quality = quality
+        self.workers = max(1, workers)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.ts_optimized = ts_optimized
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        self.journal = ConversionJournal(self.output_dir)
+        self.settings = {'output_format': output_format, 'quality': quality, 'ts_optimized': ts_optimized}
+        
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending: Dict[str, tuple] = {}   # caminho -> (tamanho, mtime_ns, instante da última mudança)
+        self._in_flight: Set[str] = set()
+        self._failed: Dict[str, tuple] = {}    # caminho -> (tamanho, mtime_ns) da tentativa que falhou
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+    
+    def output_path_for(self, input_path: str) -> str:
+        return os.path.join(self.output_dir, f"{Path(input_path).stem}.{self.output_format}")
+    
+    def _is_candidate(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return (not name.startswith('.')
+                and Path(name).suffix.lower() in self.converter.supported_video_formats
+                and not path.startswith(self.output_dir + os.sep))
+    
+    def _touch(self, path: str, now: float):
+        """Registra (ou atualiza) um arquivo candidato a conversão"""
+        if not self._is_candidate(path):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        
+        with self._lock:
+            if path in self._in_flight:
+                return
+        
+        previous = self._pending.get(path)
+        if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            return  # Nada mudou desde a última vez
+        if self._failed.get(path) == (stat.st_size, stat.st_mtime_ns):
+            return  # Já falhou com este mesmo conteúdo; só tenta de novo se o arquivo mudar
+        if not previous and self.journal.is_up_to_date(path, self.output_path_for(path), self.settings, stat):
+            return
+        self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+    
+    def _scan(self, now: float):
+        try:
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        self._touch(entry.path, now)
+        except OSError as e:
+            print(f"Erro ao varrer {self.input_dir}: {e}")
+    
+    def _enqueue_settled(self, now: float):
+        """Move para a fila os arquivos que pararam de crescer"""
+        for path, (size, mtime_ns, changed_at) in list(self._pending.items()):
+            self._touch(path, now)
+            current = self._pending.get(path)
+            if not current or current[2] != changed_at or now - changed_at < self.settle_seconds:
+                continue
+            try:
+                self._queue.put_nowait(path)
+            except queue.Full:
+                return  # Fila cheia: tenta de novo na próxima rodada
+            del self._pending[path]
+            with self._lock:
+                self._in_flight.add(path)
+    
+    def _worker(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                break
+            output_path = self.output_path_for(path)
+            try:
+                print(f"Convertendo: {os.path.basename(path)} -> {os.path.basename(output_path)}")
+                self.journal.mark_started(path, output_path, self.settings)
+                if self.ts_optimized and path.lower().endswith('.ts'):
+                    success = self.converter.ts_to_mp4_optimized(path, output_path)
+                else:
+                    success = self.converter.convert_video(path, output_path, quality=self.quality)
+                self.journal.mark_finished(path, output_path, self.settings, success)
+                if not success and not self._stop_event.is_set():
+                    stat = os.stat(path)
+                    self._failed[path] = (stat.st_size, stat.st_mtime_ns)
+                print(f"{'✓ Sucesso' if success else '✗ Falha'}: {os.path.basename(path)}")
+            except Exception as e:
+                print(f"Erro inesperado em {os.path.basename(path)}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight.discard(path)
+    
+    def run(self):
+        """Observa a pasta até stop() (ou Ctrl+C)"""
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _InotifyWatcher(self.input_dir)
+            except (OSError, AttributeError) as e:
+                print(f"inotify indisponível ({e}), usando polling")
+        
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        
+        mode = 'inotify' if inotify else f'polling a cada {self.poll_interval:g}s'
+        print(f"Observando {self.input_dir} ({mode}) -> {self.output_dir}")
+        
+        try:
+            last_scan = 0.0
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if now - last_scan >= (self.rescan_interval if inotify else self.poll_interval):
+                    self._scan(now)
+                    last_scan = now
+                self._enqueue_settled(now)
+                
+                # Dormir até o próximo evento; só acordar periodicamente se há arquivos crescendo
+                if self._pending:
+                    timeout = min(1.0, self.settle_seconds)
+                else:
+                    timeout = self.rescan_interval if inotify else self.poll_interval
+                
+                if os.name == 'nt':
+                    # select() no Windows só aceita sockets
+                    self._stop_event.wait(timeout)
+                    ready = []
+                else:
+                    watched = [self._wake_r] + ([inotify] if inotify else [])
+                    ready, _, _ = select.select(watched, [], [], timeout)
+                
+                if inotify in ready:
+                    now = time.monotonic()
+                    for path in inotify.read_events():
+                        self._touch(path, now)
+        except KeyboardInterrupt:
+            print("\nEncerrando observação...")
+        finally:
+            self._stop_event.set()
+            if inotify:
+                inotify.close()
+            # Arquivos ainda na fila ficam para o próximo início (o diário não os marcou como feitos)
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.converter.cancel()
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+            self.close()
+    
+    def stop(self):
+        """Encerra o laço de observação (pode ser chamado de outra thread)"""
+        self._stop_event.set()
+        with self._lock:
+            if self._wake_w is not None:
+                os.write(self._wake_w, b'x')
+    
+    def close(self):
+        """Fecha o pipe usado por stop() (run() chama ao terminar; pode ser chamado mais de uma vez)"""
+        with self._lock:
+            for fd in (self._wake_r, self._wake_w):
+                if fd is not None:
+                    os.close(fd)
+            self._wake_r = self._wake_w = None